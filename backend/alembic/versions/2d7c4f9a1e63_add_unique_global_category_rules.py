@@ -0,0 +1,32 @@
+"""add unique index on global category rules
+
+Revision ID: 2d7c4f9a1e63
+Revises: 9b3f61c8e7a5
+Create Date: 2026-10-19 09:12:44.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '2d7c4f9a1e63'
+down_revision = '9b3f61c8e7a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # unique_user_rule never matched global rules (NULL user_id), so keep
+    # the oldest of any duplicates before enforcing it
+    op.execute(
+        "DELETE FROM category_rules WHERE user_id IS NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM category_rules WHERE user_id IS NULL GROUP BY kind, pattern)"
+    )
+    op.create_index(
+        'unique_global_rule', 'category_rules', ['kind', 'pattern'], unique=True,
+        postgresql_where=sa.text('user_id IS NULL'), sqlite_where=sa.text('user_id IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('unique_global_rule', table_name='category_rules')
@@ -0,0 +1,47 @@
+"""add transaction import_hash and transaction_imports table
+
+Revision ID: 4e8a7d2b16c3
+Revises: c61f0e2a9b47
+Create Date: 2026-10-18 22:12:47.308114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '4e8a7d2b16c3'
+down_revision = 'c61f0e2a9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('import_hash', sa.String(), nullable=True))
+    op.create_index('ix_transactions_user_id_import_hash', 'transactions', ['user_id', 'import_hash'], unique=True)
+
+    op.create_table(
+        'transaction_imports',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('format', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('bytes_total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('bytes_read', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rows_read', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('inserted', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('duplicates', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('skipped', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_transaction_imports_user_id_created_at', 'transaction_imports', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_imports_user_id_created_at', table_name='transaction_imports')
+    op.drop_table('transaction_imports')
+    op.drop_index('ix_transactions_user_id_import_hash', table_name='transactions')
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_column('import_hash')
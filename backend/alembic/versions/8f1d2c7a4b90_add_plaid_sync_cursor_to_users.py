@@ -0,0 +1,27 @@
+"""add plaid_sync_cursor to users
+
+Revision ID: 8f1d2c7a4b90
+Revises: 3c0058a5c857
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8f1d2c7a4b90'
+down_revision = '3c0058a5c857'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # cursor returned by /transactions/sync, null until the first sync
+    op.add_column(
+        'users',
+        sa.Column('plaid_sync_cursor', sa.String(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'plaid_sync_cursor')
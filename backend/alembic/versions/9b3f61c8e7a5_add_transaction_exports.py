@@ -0,0 +1,37 @@
+"""add transaction_exports table
+
+Revision ID: 9b3f61c8e7a5
+Revises: 4e8a7d2b16c3
+Create Date: 2026-10-18 23:30:18.640925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9b3f61c8e7a5'
+down_revision = '4e8a7d2b16c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'transaction_exports',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('format', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('rows', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('bytes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('path', sa.String(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_transaction_exports_user_id_created_at', 'transaction_exports', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_exports_user_id_created_at', table_name='transaction_exports')
+    op.drop_table('transaction_exports')
@@ -0,0 +1,34 @@
+"""add plaid_backfill_checkpoints table
+
+Revision ID: a93e6b5c1d02
+Revises: f7c2d9a04b18
+Create Date: 2026-10-18 19:05:31.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a93e6b5c1d02'
+down_revision = 'f7c2d9a04b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'plaid_backfill_checkpoints',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('window_start', sa.Date(), nullable=False),
+        sa.Column('window_end', sa.Date(), nullable=False),
+        sa.Column('next_offset', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_transactions', sa.Integer(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint('user_id', 'window_start', 'window_end', name='unique_user_backfill_window'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('plaid_backfill_checkpoints')
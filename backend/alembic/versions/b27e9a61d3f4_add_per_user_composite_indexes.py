@@ -0,0 +1,30 @@
+"""add per-user composite indexes to transaction tables
+
+Revision ID: b27e9a61d3f4
+Revises: 8f1d2c7a4b90
+Create Date: 2026-10-18 11:03:17.402951
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b27e9a61d3f4'
+down_revision = '8f1d2c7a4b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # (user_id, date, id) serves both summary range scans and the feed keyset
+    op.create_index('ix_transactions_user_id_timestamp', 'transactions', ['user_id', 'timestamp', 'id'])
+    op.create_index('ix_transactions_user_id_category', 'transactions', ['user_id', 'category'])
+    op.create_index('ix_plaid_transactions_user_id_date', 'plaid_transactions', ['user_id', 'date', 'id'])
+    op.create_index('ix_plaid_transactions_user_id_category', 'plaid_transactions', ['user_id', 'category'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_plaid_transactions_user_id_category', table_name='plaid_transactions')
+    op.drop_index('ix_plaid_transactions_user_id_date', table_name='plaid_transactions')
+    op.drop_index('ix_transactions_user_id_category', table_name='transactions')
+    op.drop_index('ix_transactions_user_id_timestamp', table_name='transactions')
@@ -0,0 +1,43 @@
+"""add category_rules and raw Plaid category columns
+
+Revision ID: c61f0e2a9b47
+Revises: a93e6b5c1d02
+Create Date: 2026-10-18 20:41:09.530217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c61f0e2a9b47'
+down_revision = 'a93e6b5c1d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('plaid_transactions') as batch_op:
+        batch_op.add_column(sa.Column('merchant_name', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('category_primary', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('category_detailed', sa.String(), nullable=True))
+
+    op.create_table(
+        'category_rules',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('pattern', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint('user_id', 'kind', 'pattern', name='unique_user_rule'),
+    )
+    op.create_index('ix_category_rules_user_id_kind', 'category_rules', ['user_id', 'kind'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_category_rules_user_id_kind', table_name='category_rules')
+    op.drop_table('category_rules')
+    with op.batch_alter_table('plaid_transactions') as batch_op:
+        batch_op.drop_column('category_detailed')
+        batch_op.drop_column('category_primary')
+        batch_op.drop_column('merchant_name')
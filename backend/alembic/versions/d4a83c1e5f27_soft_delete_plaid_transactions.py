@@ -0,0 +1,60 @@
+"""replace deleted_plaid_transactions with a soft-delete flag
+
+Revision ID: d4a83c1e5f27
+Revises: b27e9a61d3f4
+Create Date: 2026-10-18 13:26:51.760334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd4a83c1e5f27'
+down_revision = 'b27e9a61d3f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('plaid_transactions') as batch_op:
+        batch_op.add_column(sa.Column('is_deleted', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_plaid_transactions_user_id_is_deleted', 'plaid_transactions', ['user_id', 'is_deleted'])
+
+    # carry hidden transactions over, keeping when they were hidden
+    op.execute("""
+        UPDATE plaid_transactions
+        SET is_deleted = true,
+            deleted_at = (
+                SELECT d.deleted_at FROM deleted_plaid_transactions d
+                WHERE d.user_id = plaid_transactions.user_id
+                  AND d.transaction_id = plaid_transactions.transaction_id
+            )
+        WHERE EXISTS (
+            SELECT 1 FROM deleted_plaid_transactions d
+            WHERE d.user_id = plaid_transactions.user_id
+              AND d.transaction_id = plaid_transactions.transaction_id
+        )
+    """)
+    op.drop_table('deleted_plaid_transactions')
+
+
+def downgrade() -> None:
+    op.create_table(
+        'deleted_plaid_transactions',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('transaction_id', sa.String(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('user_id', 'transaction_id', name='unique_user_transaction_deletion'),
+    )
+    op.execute("""
+        INSERT INTO deleted_plaid_transactions (user_id, transaction_id, deleted_at)
+        SELECT user_id, transaction_id, COALESCE(deleted_at, CURRENT_TIMESTAMP)
+        FROM plaid_transactions
+        WHERE is_deleted = true
+    """)
+    op.drop_index('ix_plaid_transactions_user_id_is_deleted', table_name='plaid_transactions')
+    with op.batch_alter_table('plaid_transactions') as batch_op:
+        batch_op.drop_column('deleted_at')
+        batch_op.drop_column('is_deleted')
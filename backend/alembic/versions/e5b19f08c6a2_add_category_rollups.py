@@ -0,0 +1,53 @@
+"""add category_rollups table
+
+Revision ID: e5b19f08c6a2
+Revises: d4a83c1e5f27
+Create Date: 2026-10-18 15:40:02.583119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5b19f08c6a2'
+down_revision = 'd4a83c1e5f27'
+branch_labels = None
+depends_on = None
+
+
+def _month(column):
+    if op.get_bind().dialect.name == 'sqlite':
+        return f"date({column}, 'start of month')"
+    return f"CAST(date_trunc('month', {column}) AS DATE)"
+
+
+def upgrade() -> None:
+    op.create_table(
+        'category_rollups',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False, server_default='0'),
+        sa.UniqueConstraint('user_id', 'month', 'category', name='unique_user_month_category'),
+    )
+
+    # backfill from existing history
+    op.execute(f"""
+        INSERT INTO category_rollups (user_id, month, category, total)
+        SELECT user_id, month, category, SUM(amount)
+        FROM (
+            SELECT user_id, {_month('timestamp')} AS month, category, amount
+            FROM transactions
+            WHERE amount > 0
+            UNION ALL
+            SELECT user_id, {_month('date')} AS month, category, amount
+            FROM plaid_transactions
+            WHERE amount > 0 AND is_deleted = false
+        ) AS spending
+        GROUP BY user_id, month, category
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('category_rollups')
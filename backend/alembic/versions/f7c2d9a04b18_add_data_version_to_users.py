@@ -0,0 +1,23 @@
+"""add data_version to users
+
+Revision ID: f7c2d9a04b18
+Revises: e5b19f08c6a2
+Create Date: 2026-10-18 17:12:44.208391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f7c2d9a04b18'
+down_revision = 'e5b19f08c6a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'data_version')
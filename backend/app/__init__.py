@@ -0,0 +1,4 @@
+from dotenv import load_dotenv
+
+# Read .env once, before any module below reads its settings.
+load_dotenv()
@@ -0,0 +1,96 @@
+"""Move transactions older than the archive horizon into yearly Parquet segments.
+
+Whole calendar years older than --days are written to ARCHIVE_DIR, one
+file per user, source and year, and deleted from the hot tables. Monthly
+rollups stay in the database. Re-running is safe: segments are merged by
+row ID, and years that were already moved have nothing left to move.
+
+    cd backend
+    python -m app.jobs.archive --days 730
+    python -m app.jobs.archive --user-id 42 --report archive_report.json
+
+Needs pyarrow.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import date
+from app.database import SessionLocal
+from app.models import User
+from app.utils.archive import ARCHIVE_AFTER_DAYS, archive_cutoff, archive_user
+from app.utils.export import parquet_available
+
+logger = logging.getLogger("app.jobs.archive")
+
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int, action="append", help="repeat for several users; default is every user")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="keep at least this much history in the database")
+    parser.add_argument("--report", default=None, help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def run(args):
+    cutoff = archive_cutoff(date.today(), args.days)
+    db = SessionLocal()
+    try:
+        user_ids = args.user_id or [row.id for row in db.query(User.id).order_by(User.id)]
+    finally:
+        db.close()
+    logger.info("Archiving transactions before %s for %d users", cutoff, len(user_ids))
+
+    started = time.perf_counter()
+    totals = {"manual": 0, "plaid": 0, "segments": 0, "bytes": 0}
+    failed = 0
+    errors = []
+    for done, user_id in enumerate(user_ids, 1):
+        db = SessionLocal()
+        try:
+            counts = archive_user(db, user_id, cutoff)
+        except Exception as e:
+            db.rollback()
+            failed += 1
+            logger.warning("Archiving failed for user %s: %s", user_id, e)
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"user_id": user_id, "error": f"{type(e).__name__}: {e}"})
+            continue
+        finally:
+            db.close()
+        for key, value in counts.items():
+            totals[key] += value
+        if counts["segments"]:
+            logger.info("Archived %d manual and %d Plaid transactions for user %s (%d/%d)",
+                        counts["manual"], counts["plaid"], user_id, done, len(user_ids))
+
+    return {
+        "cutoff": cutoff.isoformat(),
+        "users": len(user_ids),
+        "failed_users": failed,
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+        **totals,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    if not parquet_available():
+        logger.error("Archiving needs pyarrow installed")
+        return 2
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(output + "\n")
+    return 1 if report["failed_users"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
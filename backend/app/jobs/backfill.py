@@ -0,0 +1,124 @@
+"""Backfill full Plaid transaction history through /transactions/get.
+
+Each user's date range is split into monthly windows, and the windows of all
+selected users are fetched on one bounded thread pool behind a shared token
+bucket. Pages are written as they arrive and checkpointed, so re-running the
+same command resumes where an interrupted run stopped.
+
+    cd backend
+    python -m app.jobs.backfill --days 730 --workers 8 --rate 10
+    python -m app.jobs.backfill --user-id 42 --start 2023-01-01 --restart
+
+Set PLAID_HOST to run against benchmarks/fake_plaid_server.py instead of Plaid.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from app.database import SessionLocal
+from app.utils.plaid_backfill import backfill_window, pending_windows
+from app.utils.plaid_client import make_client
+from app.utils.rate_limit import RateLimitedClient, TokenBucket
+from app.utils.sync_worker import linked_user_ids
+
+logger = logging.getLogger("app.jobs.backfill")
+
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int, action="append", help="repeat for several users; default is every linked user")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first day to fetch (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last day to fetch, defaults to today")
+    parser.add_argument("--days", type=int, default=730, help="history to fetch when --start is not given")
+    parser.add_argument("--restart", action="store_true", help="ignore existing checkpoints")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=10.0, help="Plaid requests per second across all workers")
+    parser.add_argument("--burst", type=int, default=None)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--base-delay", type=float, default=1.0)
+    parser.add_argument("--plaid-host", default=None, help="overrides PLAID_HOST")
+    parser.add_argument("--report", default=None, help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def run(args):
+    end = args.end or date.today()
+    start = args.start or end - timedelta(days=args.days)
+    user_ids = args.user_id or linked_user_ids()
+
+    db = SessionLocal()
+    try:
+        tasks = [
+            (user_id, window)
+            for user_id in user_ids
+            for window in pending_windows(db, user_id, start, end, args.restart)
+        ]
+    finally:
+        db.close()
+
+    bucket = TokenBucket(args.rate, args.burst)
+    plaid = RateLimitedClient(
+        make_client(host=args.plaid_host, pool_size=args.workers),
+        bucket,
+        max_retries=args.max_retries,
+        base_delay=args.base_delay,
+    )
+    logger.info("Backfilling %d windows for %d users from %s to %s", len(tasks), len(user_ids), start, end)
+
+    started = time.perf_counter()
+    totals = {"pages": 0, "inserted": 0, "updated": 0}
+    done = failed = 0
+    errors = []
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="plaid-backfill") as pool:
+        futures = {pool.submit(backfill_window, user_id, window, plaid): (user_id, window) for user_id, window in tasks}
+        for future in as_completed(futures):
+            user_id, window = futures[future]
+            done += 1
+            try:
+                counts = future.result()
+            except Exception as e:
+                failed += 1
+                logger.warning("Backfill of %s..%s failed for user %s: %s", window[0], window[1], user_id, e)
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"user_id": user_id, "window": [window[0].isoformat(), window[1].isoformat()],
+                                   "error": f"{type(e).__name__}: {e}"})
+                continue
+            for key, value in counts.items():
+                totals[key] += value
+            logger.info("Backfilled %d/%d windows (%d failed), %d transactions so far",
+                        done, len(tasks), failed, totals["inserted"] + totals["updated"])
+
+    elapsed = time.perf_counter() - started
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "users": len(user_ids),
+        "windows": len(tasks),
+        "failed_windows": failed,
+        "elapsed_seconds": round(elapsed, 2),
+        **totals,
+        "plaid_calls": plaid.calls,
+        "plaid_retries": plaid.retries,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(output + "\n")
+    return 1 if report["failed_windows"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Refresh every linked user's Plaid transactions in one batch.
+
+Users are synced through /transactions/sync on a bounded thread pool. All
+workers share one Plaid client (one connection pool) and one token bucket,
+and rate-limit errors are retried with exponential backoff. Progress is
+logged as the job runs and a JSON report is printed (and optionally written)
+at the end.
+
+    cd backend
+    python -m app.jobs.refresh_all --workers 16 --rate 20 --report refresh_report.json
+
+Set PLAID_HOST to run against benchmarks/fake_plaid_server.py instead of Plaid.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from app.utils.plaid_client import make_client
+from app.utils.rate_limit import RateLimitedClient, TokenBucket
+from app.utils.sync_worker import linked_user_ids, sync_user
+
+logger = logging.getLogger("app.jobs.refresh_all")
+
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0, help="Plaid requests per second across all workers")
+    parser.add_argument("--burst", type=int, default=None, help="token bucket size, defaults to --rate")
+    parser.add_argument("--max-retries", type=int, default=5, help="retries per call on rate-limit errors")
+    parser.add_argument("--base-delay", type=float, default=1.0, help="first backoff delay in seconds")
+    parser.add_argument("--plaid-host", default=None, help="overrides PLAID_HOST")
+    parser.add_argument("--limit", type=int, default=None, help="only refresh this many users")
+    parser.add_argument("--progress-every", type=int, default=100)
+    parser.add_argument("--report", default=None, help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+class Progress:
+    def __init__(self, total, every):
+        self.total = total
+        self.every = max(1, every)
+        self.done = 0
+        self.failed = 0
+        self.totals = {"inserted": 0, "updated": 0, "removed": 0}
+        self.durations = []
+        self.errors = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, user_id, seconds, counts=None, error=None):
+        with self._lock:
+            self.done += 1
+            self.durations.append(seconds)
+            if error is not None:
+                self.failed += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({"user_id": user_id, "error": f"{type(error).__name__}: {error}"})
+            for key, value in (counts or {}).items():
+                self.totals[key] += value
+            if self.done % self.every == 0 or self.done == self.total:
+                elapsed = time.perf_counter() - self.started
+                rate = self.done / elapsed if elapsed else 0.0
+                eta = (self.total - self.done) / rate if rate else 0.0
+                logger.info("Refreshed %d/%d users (%d failed), %.1f users/s, eta %.0fs",
+                            self.done, self.total, self.failed, rate, eta)
+
+
+def _refresh_one(user_id, plaid, progress):
+    started = time.perf_counter()
+    try:
+        counts = sync_user(user_id, plaid)
+    except Exception as e:
+        logger.warning("Refresh failed for user %s: %s", user_id, e)
+        progress.record(user_id, time.perf_counter() - started, error=e)
+    else:
+        progress.record(user_id, time.perf_counter() - started, counts)
+
+
+def run(args):
+    user_ids = linked_user_ids()
+    if args.limit is not None:
+        user_ids = user_ids[:args.limit]
+
+    bucket = TokenBucket(args.rate, args.burst)
+    plaid = RateLimitedClient(
+        make_client(host=args.plaid_host, pool_size=args.workers),
+        bucket,
+        max_retries=args.max_retries,
+        base_delay=args.base_delay,
+    )
+    progress = Progress(len(user_ids), args.progress_every)
+    started_at = datetime.now()
+    logger.info("Refreshing %d linked users with %d workers at %.1f req/s", len(user_ids), args.workers, args.rate)
+
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="plaid-refresh") as pool:
+        futures = [pool.submit(_refresh_one, user_id, plaid, progress) for user_id in user_ids]
+        for future in as_completed(futures):
+            future.result()
+
+    elapsed = time.perf_counter() - progress.started
+    durations = sorted(progress.durations)
+    return {
+        "started_at": started_at.isoformat(),
+        "elapsed_seconds": round(elapsed, 2),
+        "users": len(user_ids),
+        "succeeded": progress.done - progress.failed,
+        "failed": progress.failed,
+        "users_per_second": round(progress.done / elapsed, 2) if elapsed else None,
+        "transactions": progress.totals,
+        "plaid_calls": plaid.calls,
+        "plaid_retries": plaid.retries,
+        "rate_limit_wait_seconds": round(bucket.waited, 2),
+        "user_seconds": {
+            "p50": percentile(durations, 50),
+            "p90": percentile(durations, 90),
+            "p99": percentile(durations, 99),
+            "max": round(durations[-1], 3) if durations else None,
+        },
+        "errors": progress.errors,
+    }
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(output + "\n")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
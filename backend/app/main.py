@@ -1,14 +1,26 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-from .database import engine, Base
-from .routes import users, transactions, auth, plaid
-load_dotenv()
+from fastapi.responses import PlainTextResponse
+from .database import engine, async_engine, Base
+from .routes import users, transactions, auth, plaid, categories
+from .utils import sync_worker, metrics
+from .routes.deps import cache_stats, require_ops_access
 
 ##Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title = "Vint: Budget Tracker API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sync_task = sync_worker.start()
+    yield
+    await sync_worker.stop(sync_task)
+    if async_engine is not None:
+        await async_engine.dispose()
 
+app = FastAPI(title = "Vint: Budget Tracker API", lifespan=lifespan)
+
+metrics.instrument_sqlalchemy()
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -20,7 +32,22 @@ app.include_router(users.router)
 app.include_router(transactions.router)
 app.include_router(auth.router)
 app.include_router(plaid.router)
+app.include_router(categories.router)
 
 @app.get("/")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/cache/stats", dependencies=[Depends(require_ops_access)])
+def read_cache_stats():
+    return cache_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_ops_access)])
+def read_metrics():
+    stats = cache_stats()
+    gauges = [
+        ("vint_cache_hits", "Cache hits since start", [((("cache", name),), s["hits"]) for name, s in stats.items()]),
+        ("vint_cache_misses", "Cache misses since start", [((("cache", name),), s["misses"]) for name, s in stats.items()]),
+        ("vint_cache_size", "Entries currently cached", [((("cache", name),), s["size"]) for name, s in stats.items() if s["size"] is not None]),
+    ]
+    return PlainTextResponse(metrics.registry.render(gauges), media_type="text/plain; version=0.0.4")
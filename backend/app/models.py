@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Date, DateTime, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -11,10 +11,12 @@ class User(Base):
     phone = Column(String, unique = True, nullable = True)
     monthly_budget = Column(Float, default = 0)
     plaid_access_token = Column(String, nullable=True)
+    plaid_sync_cursor = Column(String, nullable=True)
+    data_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     transactions = relationship("Transaction", back_populates="user")
     plaid_transactions = relationship("PlaidTransaction", back_populates="user")
-    deleted_plaid_transactions = relationship("DeletedPlaidTransaction", back_populates="user")
+    category_rollups = relationship("CategoryRollup", back_populates="user")
 
 class Transaction(Base):
     __tablename__ = "transactions"
@@ -25,6 +27,15 @@ class Transaction(Base):
     category = Column(String, nullable = False)
     description = Column(String, nullable = True)
     timestamp = Column(DateTime, default=datetime.now, nullable=False)
+    # set on rows from statement imports so re-uploading a file skips them
+    import_hash = Column(String, nullable=True)
+
+    # per-user hot paths: summary windows, the feed keyset and category filters
+    __table_args__ = (
+        Index('ix_transactions_user_id_timestamp', 'user_id', 'timestamp', 'id'),
+        Index('ix_transactions_user_id_category', 'user_id', 'category'),
+        Index('ix_transactions_user_id_import_hash', 'user_id', 'import_hash', unique=True),
+    )
 
     user = relationship("User", back_populates= "transactions")
 
@@ -38,21 +49,114 @@ class PlaidTransaction(Base):
     category = Column(String, nullable=False)
     description = Column(String, nullable=True)
     date = Column(DateTime, default=datetime.now, nullable=False)
+    # what Plaid told us, kept so category rules can be re-applied later
+    merchant_name = Column(String, nullable=True)
+    category_primary = Column(String, nullable=True)
+    category_detailed = Column(String, nullable=True)
+    # hidden by the user; kept so later syncs don't bring it back
+    is_deleted = Column(Boolean, default=False, nullable=False)
+    deleted_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_plaid_transactions_user_id_date', 'user_id', 'date', 'id'),
+        Index('ix_plaid_transactions_user_id_category', 'user_id', 'category'),
+        Index('ix_plaid_transactions_user_id_is_deleted', 'user_id', 'is_deleted'),
+    )
 
     user = relationship("User", back_populates="plaid_transactions")
 
-class DeletedPlaidTransaction(Base):
-    __tablename__ = "deleted_plaid_transactions"
+class CategoryRollup(Base):
+    __tablename__ = "category_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # first day of the month the spending falls in
+    month = Column(Date, nullable=False)
+    category = Column(String, nullable=False)
+    # sum of positive amounts from manual and visible Plaid transactions
+    total = Column(Float, default=0, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'month', 'category', name='unique_user_month_category'),
+    )
+
+    user = relationship("User", back_populates="category_rollups")
+
+class PlaidBackfillCheckpoint(Base):
+    __tablename__ = "plaid_backfill_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    window_start = Column(Date, nullable=False)
+    window_end = Column(Date, nullable=False)
+    # transactions_get offset to resume from; every page before it is stored
+    next_offset = Column(Integer, default=0, nullable=False)
+    total_transactions = Column(Integer, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'window_start', 'window_end', name='unique_user_backfill_window'),
+    )
+
+class CategoryRule(Base):
+    __tablename__ = "category_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # NULL for rules that apply to every user
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # merchant, merchant_prefix, detailed or primary
+    kind = Column(String, nullable=False)
+    pattern = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'kind', 'pattern', name='unique_user_rule'),
+        # NULLs never collide in unique_user_rule, so global rules need their own
+        Index('unique_global_rule', 'kind', 'pattern', unique=True,
+              postgresql_where=text('user_id IS NULL'), sqlite_where=text('user_id IS NULL')),
+        Index('ix_category_rules_user_id_kind', 'user_id', 'kind'),
+    )
+
+class TransactionImport(Base):
+    __tablename__ = "transaction_imports"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    transaction_id = Column(String, nullable=False)
-    deleted_at = Column(DateTime, default=datetime.now, nullable=False)
+    format = Column(String, nullable=False)
+    # pending, running, completed or failed
+    status = Column(String, default="pending", nullable=False)
+    bytes_total = Column(Integer, default=0, nullable=False)
+    bytes_read = Column(Integer, default=0, nullable=False)
+    rows_read = Column(Integer, default=0, nullable=False)
+    inserted = Column(Integer, default=0, nullable=False)
+    duplicates = Column(Integer, default=0, nullable=False)
+    # rows that couldn't be parsed
+    skipped = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
 
-    # Create a unique constraint to prevent duplicate deletions
     __table_args__ = (
-        UniqueConstraint('user_id', 'transaction_id', name='unique_user_transaction_deletion'),
+        Index('ix_transaction_imports_user_id_created_at', 'user_id', 'created_at'),
     )
 
-    user = relationship("User", back_populates="deleted_plaid_transactions")
+class TransactionExport(Base):
+    __tablename__ = "transaction_exports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    format = Column(String, nullable=False)
+    # pending, running, completed or failed
+    status = Column(String, default="pending", nullable=False)
+    rows = Column(Integer, default=0, nullable=False)
+    bytes = Column(Integer, default=0, nullable=False)
+    path = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index('ix_transaction_exports_user_id_created_at', 'user_id', 'created_at'),
+    )
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app import models, schemas
+from app.routes.deps import get_db, get_current_user
+from app.utils.categorize import invalidate_rules, normalize_pattern, recategorize
+
+router = APIRouter(prefix="/categories", tags=["categories"])
+
+
+def _recategorized(db: Session, user: models.User, apply):
+    updated = recategorize(db, user.id) if apply else 0
+    db.commit()
+    # drop the compiled rules only once the change is visible to other sessions
+    invalidate_rules(user.id)
+    return {"updated": updated, "version": user.data_version}
+
+@router.get("/rules", response_model=list[schemas.CategoryRule])
+def read_category_rules(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    return db.query(models.CategoryRule).filter(models.CategoryRule.user_id == user.id).order_by(models.CategoryRule.id).all()
+
+@router.post("/rules", status_code=status.HTTP_201_CREATED)
+def create_category_rule(
+    rule_in: schemas.CategoryRuleCreate,
+    apply: bool = Query(True, description="recategorize existing transactions"),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user)
+):
+    pattern = normalize_pattern(rule_in.kind, rule_in.pattern)
+    rule = db.query(models.CategoryRule).filter_by(user_id=user.id, kind=rule_in.kind, pattern=pattern).first()
+    if rule:
+        rule.category = rule_in.category
+    else:
+        rule = models.CategoryRule(user_id=user.id, kind=rule_in.kind, pattern=pattern, category=rule_in.category)
+        db.add(rule)
+    db.flush()
+    rule_out = schemas.CategoryRule.model_validate(rule)
+    return {"rule": rule_out, **_recategorized(db, user, apply)}
+
+@router.delete("/rules/{rule_id}")
+def delete_category_rule(
+    rule_id: int,
+    apply: bool = Query(True, description="recategorize existing transactions"),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user)
+):
+    rule = db.query(models.CategoryRule).filter_by(id=rule_id, user_id=user.id).first()
+    if not rule:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category rule not found")
+    db.delete(rule)
+    db.flush()
+    return _recategorized(db, user, apply)
+
+@router.post("/recategorize")
+def recategorize_transactions(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    return _recategorized(db, user, True)
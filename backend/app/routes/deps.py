@@ -1,18 +1,43 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError #type:ignore
-from sqlalchemy.orm import Session
-from ..database import SessionLocal
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from ..database import DB_ASYNC, SessionLocal, AsyncSessionLocal
 from app import models
-from dotenv import load_dotenv
+from app.utils.cache import TTLCache
+from app.utils import versioning
+from app.utils.result_cache import summary_cache
+import hmac
 import os
-
-load_dotenv()
+import time
 
 security = HTTPBearer()
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = "HS256"
 
+# Verified token -> user_id, and user_id -> column snapshot. Each worker has
+# its own copy, so USER_CACHE_TTL bounds how long another worker can serve a
+# stale user after an update.
+token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", "300")),
+)
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+)
+USER_COLUMNS = [column.key for column in models.User.__table__.columns]
+
+# Operational endpoints (/cache/stats, /metrics) are closed unless OPS_TOKEN is set
+# and sent as a bearer token, or the client address is in OPS_ALLOW_IPS.
+# Behind a proxy the client address is the proxy's, so prefer the token.
+OPS_TOKEN = os.getenv("OPS_TOKEN")
+OPS_ALLOW_IPS = {ip.strip() for ip in os.getenv("OPS_ALLOW_IPS", "").split(",") if ip.strip()}
+ops_security = HTTPBearer(auto_error=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -20,17 +45,100 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database sessions need DB_ASYNC=true")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def decode_user_id(token):
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail = "Invalid JWT Payload")
-        
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        return user
     except JWTError:
-        raise HTTPException(status_code=status.HTTP_403, detail="Invalid JWT Token")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid JWT Token")
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail = "Invalid JWT Payload")
+    # never cache a token past its own expiry
+    ttl = None
+    if "exp" in payload:
+        ttl = min(token_cache.ttl, payload["exp"] - time.time())
+    token_cache.set(token, user_id, ttl)
+    return user_id
+
+def invalidate_user(user_id):
+    user_cache.delete(user_id)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    invalidate_user(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_bumped_users(session):
+    # data_version is bumped with a bulk UPDATE, which skips the mapper events
+    for user_id in session.info.pop(versioning.BUMPED, ()):
+        invalidate_user(user_id)
+
+def require_ops_access(request: Request, credentials: HTTPAuthorizationCredentials | None = Depends(ops_security)):
+    if request.client is not None and request.client.host in OPS_ALLOW_IPS:
+        return
+    if OPS_TOKEN and credentials is not None and hmac.compare_digest(credentials.credentials, OPS_TOKEN):
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+
+def cache_stats():
+    return {"token": token_cache.stats(), "user": user_cache.stats(), "summary": summary_cache.stats()}
+
+def _cached_user(user_id):
+    # a detached User built from the snapshot, ready to merge without a SELECT
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        return None
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+def _remember_user(user):
+    user_cache.set(user.id, {column: getattr(user, column) for column in USER_COLUMNS})
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    user_id = decode_user_id(credentials.credentials)
+    user = _cached_user(user_id)
+    if user is not None:
+        return db.merge(user, load=False)
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    _remember_user(user)
+    return user
+
+async def get_current_user_async(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    user_id = decode_user_id(credentials.credentials)
+    user = _cached_user(user_id)
+    if user is not None:
+        return await db.merge(user, load=False)
+
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    _remember_user(user)
+    return user
+
+# The hot read routes (summary, feed, listings) are async and take their
+# session and user from these: an AsyncSession with DB_ASYNC=true, the usual
+# sync Session otherwise. Either way they run their queries through run_db.
+get_read_db = get_async_db if DB_ASYNC else get_db
+get_read_user = get_current_user_async if DB_ASYNC else get_current_user
+
+async def run_db(db, fn, *args, **kwargs):
+    # fn(session, *args, **kwargs) is ordinary sync ORM code. On an
+    # AsyncSession it runs on the async driver without leaving the event
+    # loop; a sync Session is used from the threadpool instead.
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -1,119 +1,78 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from plaid.model.link_token_create_request import LinkTokenCreateRequest
-from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
-from plaid.model.transactions_get_request import TransactionsGetRequest
-from plaid.model.country_code import CountryCode
-from plaid.model.products import Products
-from plaid.exceptions import ApiException
-from app.utils.plaid_client import client
-from app.routes.deps import get_current_user
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from app.utils.plaid_client import get_client
+from app.utils.sync_worker import sync_user
+from app.utils import archive, rollups
+from app.utils.metrics import track_plaid
+from app.utils.fastjson import stream_rows
+from app.utils.versioning import cache_headers, current_version, etag, not_modified, touch
+from app.routes.deps import get_current_user, get_read_db, get_read_user, run_db
 from sqlalchemy.orm import Session
 from app.routes.deps import get_db
-from app.models import PlaidTransaction, User, DeletedPlaidTransaction
-from datetime import date, timedelta
+from app.models import PlaidTransaction, User
+from app.schemas import PlaidTransactionIds
+from datetime import datetime
+from sqlalchemy import not_
 import json
+import logging
 
 
 router = APIRouter(prefix="/plaid", tags=["plaid"])
-category_map = {
-    "INCOME": "Income",
-    "TRANSFER_IN": "Income",
-    "TRANSFER_OUT": "Transfers",
-    "BANK_FEES": "Fees",
-    "ENTERTAINMENT": "Entertainment",
-    "FOOD_AND_DRINK": "Food",
-    "TRAVEL": "Transportation",
-    "RENT_AND_UTILITIES": "Bills",
-    "LOAN_PAYMENTS": "Debt Payments",
-    "GENERAL_MERCHANDISE": "Shopping",
-    "HOME_IMPROVEMENT": "Home",
-    "MEDICAL": "Health",
-    "PERSONAL_CARE": "Shopping",
-    "GENERAL_SERVICES": "Bills",
-    "GOVERNMENT_AND_NON_PROFIT": "Government",
-    "TRANSPORTATION": "Transportation", 
-    "OTHER": "Other"
-}
+logger = logging.getLogger(__name__)
+
+def _listing_query(user_id, include_deleted):
+    def build(db: Session):
+        query = db.query(
+            PlaidTransaction.transaction_id,
+            PlaidTransaction.description.label("name"),
+            PlaidTransaction.amount,
+            PlaidTransaction.date,
+            PlaidTransaction.category,
+            PlaidTransaction.is_deleted,
+        ).filter(PlaidTransaction.user_id == user_id)
+        if not include_deleted:
+            query = query.filter(not_(PlaidTransaction.is_deleted))
+        return query
+    return build
+
+def _archived_listing(user_id, include_deleted):
+    def rows():
+        columns = ["transaction_id", "description", "amount", "date", "category", "is_deleted"]
+        for row in archive.iter_rows(user_id, "plaid", columns):
+            if include_deleted or not row["is_deleted"]:
+                row["name"] = row.pop("description")
+                yield row
+    return rows
 
 @router.get("/transactions")
-def get_plaid_transactions(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    access_token = user.plaid_access_token
-    if not access_token:
+async def get_plaid_transactions(request: Request, format: str = Query("json", pattern="^(json|ndjson)$"), db = Depends(get_read_db), user: User = Depends(get_read_user)):
+    if not user.plaid_access_token:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Plaid access token not found")
 
-    end_date = date.today()
-    start_date = end_date - timedelta(days=30)
-
-    try:
-        request = TransactionsGetRequest(
-            access_token=access_token,
-            start_date=start_date,
-            end_date=end_date
-        )
-        plaid_response = client.transactions_get(request)
-        transactions = plaid_response['transactions']    
-        saved_ids = {
-            row.transaction_id
-            for row in db.query(PlaidTransaction.transaction_id)
-            .filter(PlaidTransaction.user_id == user.id)
-            .all()
-        }
-        
-        deleted_ids = {
-            row.transaction_id
-            for row in db.query(DeletedPlaidTransaction.transaction_id)
-            .filter(DeletedPlaidTransaction.user_id == user.id)
-            .all()
-        }
+    tag = etag(user.id, await run_db(db, current_version, user.id), "plaid_transactions", format)
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(tag))
+    return stream_rows(
+        _listing_query(user.id, include_deleted=False), format, key="transactions",
+        headers=cache_headers(tag), archived=_archived_listing(user.id, include_deleted=False),
+    )
 
-        new_transactions = []
-        for t in transactions:
-            if t["transaction_id"] in saved_ids or t["transaction_id"] in deleted_ids:
-                continue
-                
-            pf_category = t.get("personal_finance_category")
-            primary_category = pf_category.get("primary") if pf_category else None
-            mapped_category = category_map.get(primary_category, "Uncategorized")
 
-            new_txn = PlaidTransaction(
-                transaction_id=t["transaction_id"],
-                user_id=user.id,
-                category=mapped_category,
-                description=t.get("name"),
-                amount=t.get("amount"),
-                date=t.get("date")
-            )
-            db.add(new_txn)
-            new_transactions.append(new_txn)
+@router.post("/sync", status_code=status.HTTP_202_ACCEPTED)
+def request_plaid_sync(background_tasks: BackgroundTasks, user: User = Depends(get_current_user)):
+    if not user.plaid_access_token:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Plaid access token not found")
 
-        db.commit()
-        
-        saved = db.query(PlaidTransaction).filter(
-            PlaidTransaction.user_id == user.id
-        ).all()
-        
-        non_deleted_transactions = [
-            t for t in saved 
-            if t.transaction_id not in deleted_ids
-        ]
-        
-        return {"transactions": [
-            {
-                "transaction_id": t.transaction_id, 
-                "name": t.description, 
-                "amount": t.amount, 
-                "date": t.date.isoformat(), 
-                "category": t.category,
-                "is_deleted": False
-            } for t in non_deleted_transactions
-        ]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Plaid fetch failed: {str(e)}")
+    background_tasks.add_task(sync_user, user.id)
+    return {"message": "Plaid sync scheduled"}
 
 
 @router.post("/link_token")
 def generate_link_token(user=Depends(get_current_user)):
+    from plaid.model.country_code import CountryCode
+    from plaid.model.link_token_create_request import LinkTokenCreateRequest
+    from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
+    from plaid.model.products import Products
+
     try:
         request = LinkTokenCreateRequest(
             user=LinkTokenCreateRequestUser(client_user_id=str(user.id)),
@@ -122,7 +81,8 @@ def generate_link_token(user=Depends(get_current_user)):
             country_codes=[CountryCode("US")],
             language="en"
         )
-        response = client.link_token_create(request)
+        with track_plaid("link_token_create"):
+            response = get_client().link_token_create(request)
         return response.to_dict()
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Plaid link token creation failed")
@@ -130,32 +90,72 @@ def generate_link_token(user=Depends(get_current_user)):
 
 
 @router.post("/set_access_token")
-def exchange_public_token(payload: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def exchange_public_token(payload: dict, background_tasks: BackgroundTasks, db: Session = Depends(get_db), user=Depends(get_current_user)):
     public_token = payload.get("public_token")
     if not public_token:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing public_token")
 
+    from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
+
     try:
         request = ItemPublicTokenExchangeRequest(public_token=public_token)
-        response = client.item_public_token_exchange(request)
+        with track_plaid("item_public_token_exchange"):
+            response = get_client().item_public_token_exchange(request)
         access_token = response['access_token']
-
-        print("✅ Got access_token from Plaid:", access_token)
-        print("✅ Saving access_token to user_id:", user.id)
+        logger.info("Saving Plaid access token for user %s", user.id)
 
         user.plaid_access_token = access_token
+        user.plaid_sync_cursor = None
         db.add(user)
         db.commit()
         db.refresh(user)
 
+        # Pull the initial history now rather than waiting for the next round.
+        background_tasks.add_task(sync_user, user.id)
         return {"message": "Plaid access token saved successfully"}
     except Exception as e:
-        print("Plaid token exchange error:", str(e))
+        logger.warning("Plaid token exchange failed for user %s: %s", user.id, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Plaid token exchange failed")
     
 
+def _delta(db: Session, user: User, response: Response, changed, unchanged=()):
+    # what changed and the version it brings the user to; the client patches
+    # its copy instead of refetching the whole history
+    if changed:
+        touch(db, user.id)
+    db.commit()
+    version = user.data_version
+    response.headers["ETag"] = etag(user.id, version)
+    body = {
+        "transactions": [{"transaction_id": tid, "is_deleted": hidden} for tid, hidden in changed],
+        "version": version,
+    }
+    if unchanged:
+        body["skipped"] = list(unchanged)
+    return body
+
+def _set_hidden(db: Session, user: User, response: Response, transaction_ids, hidden):
+    transaction_ids = list(dict.fromkeys(transaction_ids))
+    rows = db.query(PlaidTransaction.id, PlaidTransaction.transaction_id, PlaidTransaction.date).filter(
+        PlaidTransaction.user_id == user.id,
+        PlaidTransaction.transaction_id.in_(transaction_ids),
+        PlaidTransaction.is_deleted == (not hidden)
+    ).all()
+    if rows:
+        db.query(PlaidTransaction).filter(
+            PlaidTransaction.id.in_([row.id for row in rows])
+        ).update({"is_deleted": hidden, "deleted_at": datetime.now() if hidden else None}, synchronize_session=False)
+        rollups.rebuild_months(db, user.id, {rollups.month_start(row.date) for row in rows})
+
+    changed = {row.transaction_id for row in rows}
+    return _delta(
+        db, user, response,
+        [(tid, hidden) for tid in transaction_ids if tid in changed],
+        [tid for tid in transaction_ids if tid not in changed],
+    )
+
 @router.delete("/delete_transaction/{transaction_id}")
-def delete_plaid_transaction(transaction_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def delete_plaid_transaction(transaction_id: str, response: Response, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     transaction = db.query(PlaidTransaction).filter_by(
         user_id=user.id, 
         transaction_id=transaction_id
@@ -164,116 +164,33 @@ def delete_plaid_transaction(transaction_id: str, db: Session = Depends(get_db),
     if not transaction:
         raise HTTPException(status_code=404, detail="Plaid transaction not found")
     
-    existing_deletion = db.query(DeletedPlaidTransaction).filter_by(
-        user_id=user.id,
-        transaction_id=transaction_id
-    ).first()
-    
-    if existing_deletion:
+    if transaction.is_deleted:
         raise HTTPException(status_code=400, detail="Transaction already deleted")
     
-    deleted_txn = DeletedPlaidTransaction(
-        user_id=user.id,
-        transaction_id=transaction_id
-    )
-    db.add(deleted_txn)
-    db.commit()
+    transaction.is_deleted = True
+    transaction.deleted_at = datetime.now()
+    rollups.remove_transaction(db, user.id, transaction.date, transaction.category, transaction.amount)
+    return _delta(db, user, response, [(transaction_id, True)])
 
-    saved = db.query(PlaidTransaction).filter(
-        PlaidTransaction.user_id == user.id
-    ).all()
-    
-    deleted_ids = {
-        row.transaction_id
-        for row in db.query(DeletedPlaidTransaction.transaction_id)
-        .filter(DeletedPlaidTransaction.user_id == user.id)
-        .all()
-    }
-    
-    return {"transactions": [
-        {
-            "transaction_id": t.transaction_id, 
-            "name": t.description, 
-            "amount": t.amount, 
-            "date": t.date.isoformat(), 
-            "category": t.category,
-            "is_deleted": t.transaction_id in deleted_ids
-        } for t in saved
-    ]}
+@router.post("/hide_transactions")
+def hide_plaid_transactions(payload: PlaidTransactionIds, response: Response, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    return _set_hidden(db, user, response, payload.transaction_ids, hidden=True)
 
 @router.get("/all_transactions")
-def get_all_plaid_transactions(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    access_token = user.plaid_access_token
-    if not access_token:
+async def get_all_plaid_transactions(request: Request, format: str = Query("json", pattern="^(json|ndjson)$"), db = Depends(get_read_db), user: User = Depends(get_read_user)):
+    if not user.plaid_access_token:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Plaid access token not found")
 
-    end_date = date.today()
-    start_date = end_date - timedelta(days=30)
-
-    try:
-        request = TransactionsGetRequest(
-            access_token=access_token,
-            start_date=start_date,
-            end_date=end_date
-        )
-        plaid_response = client.transactions_get(request)
-        transactions = plaid_response['transactions']
-    
-        saved_ids = {
-            row.transaction_id
-            for row in db.query(PlaidTransaction.transaction_id)
-            .filter(PlaidTransaction.user_id == user.id)
-            .all()
-        }
-        
-        deleted_ids = {
-            row.transaction_id
-            for row in db.query(DeletedPlaidTransaction.transaction_id)
-            .filter(DeletedPlaidTransaction.user_id == user.id)
-            .all()
-        }
-
-        new_transactions = []
-        for t in transactions:
-            if t["transaction_id"] in saved_ids:
-                continue
-                
-            pf_category = t.get("personal_finance_category")
-            primary_category = pf_category.get("primary") if pf_category else None
-            mapped_category = category_map.get(primary_category, "Uncategorized")
-
-            new_txn = PlaidTransaction(
-                transaction_id=t["transaction_id"],
-                user_id=user.id,
-                category=mapped_category,
-                description=t.get("name"),
-                amount=t.get("amount"),
-                date=t.get("date")
-            )
-            db.add(new_txn)
-            new_transactions.append(new_txn)
-
-        db.commit()
-        
-        saved = db.query(PlaidTransaction).filter(
-            PlaidTransaction.user_id == user.id
-        ).all()
-        
-        return {"transactions": [
-            {
-                "transaction_id": t.transaction_id, 
-                "name": t.description, 
-                "amount": t.amount, 
-                "date": t.date.isoformat(), 
-                "category": t.category,
-                "is_deleted": t.transaction_id in deleted_ids
-            } for t in saved
-        ]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Plaid fetch failed: {str(e)}")
+    tag = etag(user.id, await run_db(db, current_version, user.id), "plaid_all_transactions", format)
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(tag))
+    return stream_rows(
+        _listing_query(user.id, include_deleted=True), format, key="transactions",
+        headers=cache_headers(tag), archived=_archived_listing(user.id, include_deleted=True),
+    )
 
 @router.post("/restore_transaction/{transaction_id}")
-def restore_plaid_transaction(transaction_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def restore_plaid_transaction(transaction_id: str, response: Response, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     transaction = db.query(PlaidTransaction).filter_by(
         user_id=user.id, 
         transaction_id=transaction_id
@@ -282,60 +199,30 @@ def restore_plaid_transaction(transaction_id: str, db: Session = Depends(get_db)
     if not transaction:
         raise HTTPException(status_code=404, detail="Plaid transaction not found")
     
-    deleted_record = db.query(DeletedPlaidTransaction).filter_by(
-        user_id=user.id,
-        transaction_id=transaction_id
-    ).first()
-    
-    if not deleted_record:
+    if not transaction.is_deleted:
         raise HTTPException(status_code=400, detail="Transaction is not deleted")
     
-    db.delete(deleted_record)
-    db.commit()
-    saved = db.query(PlaidTransaction).filter(
-        PlaidTransaction.user_id == user.id
-    ).all()
-    
-    deleted_ids = {
-        row.transaction_id
-        for row in db.query(DeletedPlaidTransaction.transaction_id)
-        .filter(DeletedPlaidTransaction.user_id == user.id)
-        .all()
-    }
-    
-    return {"transactions": [
-        {
-            "transaction_id": t.transaction_id, 
-            "name": t.description, 
-            "amount": t.amount, 
-            "date": t.date.isoformat(), 
-            "category": t.category,
-            "is_deleted": t.transaction_id in deleted_ids
-        } for t in saved
-    ]}
+    transaction.is_deleted = False
+    transaction.deleted_at = None
+    rollups.add_transaction(db, user.id, transaction.date, transaction.category, transaction.amount)
+    return _delta(db, user, response, [(transaction_id, False)])
 
-@router.post("/restore_all_transactions")
-def restore_all_plaid_transactions(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    deleted_count = db.query(DeletedPlaidTransaction).filter_by(
-        user_id=user.id
-    ).delete()
-    
-    db.commit()
+@router.post("/restore_transactions")
+def restore_plaid_transactions(payload: PlaidTransactionIds, response: Response, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    return _set_hidden(db, user, response, payload.transaction_ids, hidden=False)
 
-    saved = db.query(PlaidTransaction).filter(
-        PlaidTransaction.user_id == user.id
+@router.post("/restore_all_transactions")
+def restore_all_plaid_transactions(response: Response, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    hidden = db.query(PlaidTransaction.transaction_id, PlaidTransaction.date).filter(
+        PlaidTransaction.user_id == user.id,
+        PlaidTransaction.is_deleted
     ).all()
-    
-    return {
-        "message": f"Restored {deleted_count} transactions",
-        "transactions": [
-            {
-                "transaction_id": t.transaction_id, 
-                "name": t.description, 
-                "amount": t.amount, 
-                "date": t.date.isoformat(), 
-                "category": t.category,
-                "is_deleted": False
-            } for t in saved
-        ]
-    }
\ No newline at end of file
+    db.query(PlaidTransaction).filter(
+        PlaidTransaction.user_id == user.id,
+        PlaidTransaction.is_deleted
+    ).update({"is_deleted": False, "deleted_at": None}, synchronize_session=False)
+    rollups.rebuild_months(db, user.id, {rollups.month_start(t.date) for t in hidden})
+
+    body = _delta(db, user, response, [(t.transaction_id, False) for t in hidden])
+    body["message"] = f"Restored {len(hidden)} transactions"
+    return body
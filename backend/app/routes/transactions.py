@@ -1,76 +1,294 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status, Query
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 from app import models, schemas
-from app.routes.deps import get_db, get_current_user
-from datetime import datetime, timedelta
-from sqlalchemy import func, not_
+from app.routes.deps import get_db, get_current_user, get_read_db, get_read_user, run_db
+from app.utils.feed import query_feed, InvalidCursor
+from app.utils import rollups
+from app.utils.fastjson import FastJSONResponse, stream_rows
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from app.utils.versioning import cache_headers, current_version, etag, not_modified, touch
+from app.utils.result_cache import analytics_cache, summary_cache
+from app.utils import archive, export, statement_import
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import os
+import tempfile
 
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
+
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(256 * 1024 * 1024)))
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR") or None
+
 @router.post("/", response_model=schemas.Transaction, status_code=status.HTTP_201_CREATED)
 def create_transaction(transaction_in: schemas.TransactionCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
    transaction =  models.Transaction(**transaction_in.dict(), user_id= user.id)
    db.add(transaction)
+   db.flush()
+   rollups.add_transaction(db, user.id, transaction.timestamp, transaction.category, transaction.amount)
    db.commit()
    db.refresh(transaction)
    return transaction
 
+def _transaction_out(row):
+    return {
+        "id": row["id"],
+        "amount": row["amount"],
+        "category": row["category"],
+        "description": row["description"],
+        "timestamp": row["timestamp"],
+    }
+
+@router.post("/batch")
+def batch_transactions(batch: schemas.TransactionBatch, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    # Creates, then updates, then deletes, all in one transaction: one
+    # multi-row INSERT, one executemany UPDATE and one DELETE. Unknown IDs
+    # are reported per item instead of failing the batch.
+    Transaction = models.Transaction
+    target_ids = {item.id for item in batch.update} | set(batch.delete)
+    existing = {
+        row.id: dict(row._mapping)
+        for row in db.query(
+            Transaction.id, Transaction.amount, Transaction.category, Transaction.description, Transaction.timestamp
+        ).filter(Transaction.user_id == user.id, Transaction.id.in_(target_ids))
+    } if target_ids else {}
+    deltas = defaultdict(float)
+
+    def count(row, sign):
+        deltas[(rollups.month_start(row["timestamp"]), row["category"])] += sign * rollups.contribution(row["amount"])
+
+    created = []
+    if batch.create:
+        now = datetime.now()
+        rows = [
+            {
+                "user_id": user.id,
+                "amount": item.amount,
+                "category": item.category,
+                "description": item.description,
+                "timestamp": item.timestamp or now,
+            }
+            for item in batch.create
+        ]
+        # one multi-row INSERT on PostgreSQL; dialects that can't keep the
+        # RETURNING order in a batch (SQLite) fall back to a row at a time
+        ids = db.execute(
+            insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for item, row, new_id in zip(batch.create, rows, ids):
+            row["id"] = new_id
+            count(row, 1)
+            created.append({"client_id": item.client_id, "status": "created", "transaction": _transaction_out(row)})
+
+    updated, changes = [], []
+    for item in batch.update:
+        row = existing.get(item.id)
+        if row is None:
+            updated.append({"id": item.id, "status": "not_found"})
+            continue
+        count(row, -1)
+        row.update(amount=item.amount, category=item.category, description=item.description)
+        count(row, 1)
+        changes.append({"id": item.id, "amount": item.amount, "category": item.category, "description": item.description})
+        updated.append({"id": item.id, "status": "updated", "transaction": _transaction_out(row)})
+    if changes:
+        db.execute(update(Transaction), changes)
+
+    deleted, delete_ids = [], []
+    for transaction_id in batch.delete:
+        row = existing.pop(transaction_id, None)
+        if row is None:
+            deleted.append({"id": transaction_id, "status": "not_found"})
+            continue
+        count(row, -1)
+        delete_ids.append(transaction_id)
+        deleted.append({"id": transaction_id, "status": "deleted"})
+    if delete_ids:
+        db.query(Transaction).filter(
+            Transaction.user_id == user.id, Transaction.id.in_(delete_ids)
+        ).delete(synchronize_session=False)
+
+    rollups.apply_deltas(db, user.id, deltas)
+    if created or changes or delete_ids:
+        touch(db, user.id)
+    db.commit()
+    return {"created": created, "updated": updated, "deleted": deleted, "version": user.data_version}
+
+@router.post("/import", status_code=status.HTTP_202_ACCEPTED)
+async def import_statement(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    format: str = Query("csv", pattern="^(csv|ofx)$"),
+    spending_positive: bool = Query(False, description="CSV amounts already show spending as positive"),
+    user: models.User = Depends(get_current_user)
+):
+    # The raw request body is the statement. It is copied to disk as it
+    # arrives and parsed after the response; poll the returned job for progress.
+    spool = tempfile.NamedTemporaryFile(prefix="vint-import-", dir=IMPORT_SPOOL_DIR, delete=False)
+    size = 0
+    try:
+        with spool:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Statement too large")
+                spool.write(chunk)
+        if not size:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty statement")
+        job_id = await run_in_threadpool(statement_import.create_job, user.id, format, size)
+    except BaseException:
+        os.remove(spool.name)
+        raise
+
+    background_tasks.add_task(statement_import.run_import, job_id, spool.name, spending_positive)
+    return {"job_id": job_id, "status": "pending", "bytes_total": size}
+
+@router.get("/import/{job_id}")
+def read_import(job_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    job = db.query(models.TransactionImport).filter(
+        models.TransactionImport.id == job_id, models.TransactionImport.user_id == user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import not found")
+    return statement_import.job_status(job)
+
+@router.get("/export")
+def export_transactions(user: models.User = Depends(get_current_user)):
+    # manual and Plaid history as one CSV, streamed chunk by chunk
+    return StreamingResponse(
+        export.stream_csv(user.id),
+        media_type=export.MEDIA_TYPES["csv"],
+        headers={"Content-Disposition": 'attachment; filename="transactions.csv"'},
+    )
+
+@router.post("/export", status_code=status.HTTP_202_ACCEPTED)
+def request_export(
+    background_tasks: BackgroundTasks,
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user)
+):
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Parquet export needs pyarrow installed")
+
+    export.expire_exports(db, user.id)
+    job = models.TransactionExport(user_id=user.id, format=format)
+    db.add(job)
+    db.commit()
+    background_tasks.add_task(export.run_export, job.id)
+    return {"job_id": job.id, "status": job.status}
+
+def _export_job(db: Session, user: models.User, job_id):
+    job = db.query(models.TransactionExport).filter(
+        models.TransactionExport.id == job_id, models.TransactionExport.user_id == user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found")
+    return job
+
+@router.get("/export/{job_id}")
+def read_export(job_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    return export.job_status(_export_job(db, user, job_id))
+
+@router.get("/export/{job_id}/download")
+def download_export(job_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    job = _export_job(db, user, job_id)
+    if job.status == "expired":
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export expired")
+    if job.status != "completed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Export not ready")
+    return FileResponse(job.path, media_type=export.MEDIA_TYPES[job.format], filename=f"transactions-{job.id}.{job.format}")
+
 @router.get("/", response_model=list[schemas.Transaction])
-def read_transactions(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return db.query(models.Transaction).filter(models.Transaction.user_id == user.id).all()
+async def read_transactions(request: Request, format: str = Query("json", pattern="^(json|ndjson)$"), db = Depends(get_read_db), user: models.User = Depends(get_read_user)):
+    tag = etag(user.id, await run_db(db, current_version, user.id), "transactions", format)
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(tag))
+
+    # rows come straight from our own table, so skip response_model revalidation
+    user_id = user.id
+    return stream_rows(lambda db: db.query(
+        models.Transaction.amount,
+        models.Transaction.category,
+        models.Transaction.description,
+        models.Transaction.id,
+        models.Transaction.timestamp,
+    ).filter(models.Transaction.user_id == user_id), format, headers=cache_headers(tag), archived=lambda: archive.iter_rows(
+        user_id, "manual", ["amount", "category", "description", "id", "timestamp"]
+    ))
+
+@router.get("/feed")
+async def read_transaction_feed(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    category: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    include_deleted: bool = False,
+    db = Depends(get_read_db),
+    user: models.User = Depends(get_read_user)
+):
+    try:
+        return FastJSONResponse(await run_db(
+            db, query_feed, user.id, limit, cursor,
+            start_date=start_date,
+            end_date=end_date,
+            category=category,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            include_deleted=include_deleted,
+        ))
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
 
 @router.get("/summary")
-def get_summary(days: int | None = Query(None, ge=1), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    if days is not None:
-        start = datetime.today() - timedelta(days=days)
-    else:
-        start = datetime.today().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    # Manual
-    manual_results = (
-        db.query(
-            models.Transaction.category,
-            func.sum(models.Transaction.amount).label("Total"))
-        .filter(
-            models.Transaction.user_id == user.id,
-            models.Transaction.timestamp >= start,
-            models.Transaction.amount > 0 
-        )
-        .group_by(models.Transaction.category)
-        .all()
-    )
-    deleted_ids = db.query(models.DeletedPlaidTransaction.transaction_id).filter(
-        models.DeletedPlaidTransaction.user_id == user.id
-    ).all()
-    deleted_ids = [row[0] for row in deleted_ids] or ["__none__"]
-
-
-    plaid_results = (
-        db.query(
-            models.PlaidTransaction.category,
-            func.sum(models.PlaidTransaction.amount).label("Total"))
-        .filter(
-            models.PlaidTransaction.user_id == user.id,
-            models.PlaidTransaction.date >= start,
-            models.PlaidTransaction.amount > 0, 
-            not_(models.PlaidTransaction.transaction_id.in_(deleted_ids))
-        )
-        .group_by(models.PlaidTransaction.category)
-        .all()
-    )
-    print("Manual:", manual_results)
-    print("Plaid:", plaid_results)
-    print("Deleted IDs:", deleted_ids)
+async def get_summary(request: Request, response: Response, days: int | None = Query(None, ge=1), db = Depends(get_read_db), user: models.User = Depends(get_read_user)):
+    # The window starts at midnight, so it moves once a day and today in
+    # the tag and cache key covers it.
+    today = date.today()
+    first_day = today - timedelta(days=days) if days is not None else today.replace(day=1)
+    start = datetime.combine(first_day, datetime.min.time())
+
+    version = await run_db(db, current_version, user.id)
+    tag = etag(user.id, version, "summary", days or "mtd", today)
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(tag))
+    response.headers.update(cache_headers(tag))
+
+    key = summary_cache.key(user.id, version, days or "mtd", today)
+    return await summary_cache.get_or_compute_async(key, lambda: run_db(db, rollups.summarize, user.id, start))
+
 
+@router.get("/analytics")
+def get_analytics(
+    request: Request,
+    response: Response,
+    days: int = Query(90, ge=7, le=3660),
+    window: int = Query(7, ge=1, le=365),
+    period: int = Query(30, ge=1, le=1830),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user)
+):
+    # the budget lives on the user row, which bumps no data_version, and
+    # both are read fresh rather than from the cached user
+    version, budget = db.query(models.User.data_version, models.User.monthly_budget).filter(models.User.id == user.id).one()
+    variant = (days, window, period, budget, date.today())
+    tag = etag(user.id, version, "analytics", *variant)
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(tag))
+    response.headers.update(cache_headers(tag))
 
-    # Merge
-    summary = {}
-    for cat, total in manual_results:
-        summary[cat] = float(total)
-    for cat, total in plaid_results:
-        summary[cat] = summary.get(cat, 0) + float(total)
+    # numpy is only imported when analytics are first asked for
+    from app.utils import analytics
 
-    return summary
+    key = analytics_cache.key(user.id, version, *variant)
+    return analytics_cache.get_or_compute(key, lambda: analytics.spending_analytics(
+        db, user.id, budget, days=days, window=window, period=period
+    ))
 
 
 @router.put("/{transaction_id}", response_model=schemas.Transaction, status_code=status.HTTP_200_OK)
@@ -79,9 +297,11 @@ def update_transaction(transaction_id: int, transaction_in: schemas.TransactionC
     if not transaction:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Transaction not found")
     
+    rollups.remove_transaction(db, user.id, transaction.timestamp, transaction.category, transaction.amount)
     transaction.amount = transaction_in.amount
     transaction.category = transaction_in.category
     transaction.description = transaction_in.description
+    rollups.add_transaction(db, user.id, transaction.timestamp, transaction.category, transaction.amount)
 
     db.commit()
     db.refresh(transaction)
@@ -93,6 +313,7 @@ def delete_transaction(transaction_id, db: Session= Depends(get_db), user: model
     if not transaction:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Transaction not found")
 
+    rollups.remove_transaction(db, user.id, transaction.timestamp, transaction.category, transaction.amount)
     db.delete(transaction)
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
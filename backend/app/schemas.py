@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
 from datetime import datetime
 
 
@@ -15,6 +15,19 @@ class Transaction(TransactionCreate):
     class Config: 
         from_attributes = True
 
+class TransactionBatchCreate(TransactionCreate):
+    # echoed back so offline clients can match results to their local rows
+    client_id: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+class TransactionBatchUpdate(TransactionCreate):
+    id: int
+
+class TransactionBatch(BaseModel):
+    create: list[TransactionBatchCreate] = Field(default_factory=list, max_length=1000)
+    update: list[TransactionBatchUpdate] = Field(default_factory=list, max_length=1000)
+    delete: list[int] = Field(default_factory=list, max_length=1000)
+
 class UserBase(BaseModel):
     email: str
     phone: Optional[str] = None
@@ -29,3 +42,18 @@ class User(UserBase):
     class Config: 
         orm_mode = True
 
+
+class PlaidTransactionIds(BaseModel):
+    transaction_ids: list[str] = Field(..., min_length=1, max_length=1000)
+
+class CategoryRuleCreate(BaseModel):
+    kind: Literal["merchant", "merchant_prefix", "detailed", "primary"]
+    pattern: str = Field(..., min_length=1)
+    category: str = Field(..., min_length=1)
+
+class CategoryRule(CategoryRuleCreate):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
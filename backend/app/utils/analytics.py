@@ -0,0 +1,143 @@
+from datetime import date, datetime, time, timedelta
+import calendar
+import numpy as np
+from sqlalchemy import not_
+from sqlalchemy.orm import Session
+from app.models import PlaidTransaction, Transaction
+from app.utils import archive
+
+# Spending analytics over one columnar load: a user's manual and visible
+# Plaid spending in the window comes back as three NumPy arrays (day offset,
+# category code, amount) and every series below is a bincount or cumsum
+# over them, instead of a GROUP BY per chart.
+
+
+def load_spending(db: Session, user_id, start, end):
+    # positive amounts only, like the summary and the rollups
+    manual = db.query(Transaction.timestamp, Transaction.category, Transaction.amount).filter(
+        Transaction.user_id == user_id,
+        Transaction.timestamp >= start,
+        Transaction.timestamp < end + timedelta(days=1),
+        Transaction.amount > 0
+    ).all()
+    plaid = db.query(PlaidTransaction.date, PlaidTransaction.category, PlaidTransaction.amount).filter(
+        PlaidTransaction.user_id == user_id,
+        PlaidTransaction.date >= start,
+        PlaidTransaction.date < end + timedelta(days=1),
+        PlaidTransaction.amount > 0,
+        not_(PlaidTransaction.is_deleted)
+    ).all()
+    rows = manual + plaid + archive.spending(
+        user_id, datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+    )
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), []
+
+    when, categories, amounts = zip(*rows)
+    days = (np.array(when, dtype="datetime64[D]") - np.datetime64(start, "D")).astype(np.int64)
+    names, codes = np.unique(np.array(categories, dtype=object), return_inverse=True)
+    return days, codes, np.array(amounts, dtype=np.float64), names.tolist()
+
+
+def _rounded(values):
+    return np.round(values, 2).tolist()
+
+
+def _period_deltas(by_category, names, n_days, period):
+    # the last `period` days against the `period` days before them
+    current = by_category[:, n_days - period:].sum(axis=1)
+    previous = by_category[:, max(0, n_days - 2 * period):n_days - period].sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+    deltas = {
+        name: {
+            "current": round(float(current[i]), 2),
+            "previous": round(float(previous[i]), 2),
+            "delta": round(float(current[i] - previous[i]), 2),
+            "percent": None if np.isnan(change[i]) else round(float(change[i]), 1),
+        }
+        for i, name in enumerate(names)
+        if current[i] or previous[i]
+    }
+    total_current, total_previous = float(current.sum()), float(previous.sum())
+    deltas_total = {
+        "current": round(total_current, 2),
+        "previous": round(total_previous, 2),
+        "delta": round(total_current - total_previous, 2),
+        "percent": round((total_current - total_previous) / total_previous * 100, 1) if total_previous else None,
+    }
+    return deltas, deltas_total
+
+
+def _burn_down(daily, start, today, budget):
+    month_first = today.replace(day=1)
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    elapsed = today.day
+    month_daily = daily[(month_first - start).days:]
+    spent_by_day = np.cumsum(month_daily)
+    spent = float(spent_by_day[-1]) if len(spent_by_day) else 0.0
+    # straight-line run rate from the month so far
+    projected = spent / elapsed * days_in_month
+    return {
+        "month": month_first.isoformat(),
+        "budget": budget,
+        "spent": round(spent, 2),
+        "remaining": round(budget - spent, 2),
+        "days_elapsed": elapsed,
+        "days_in_month": days_in_month,
+        "remaining_by_day": _rounded(budget - spent_by_day),
+        "ideal_remaining_by_day": _rounded(budget - budget * np.arange(1, elapsed + 1) / days_in_month),
+        "projected_month_end": round(projected, 2),
+        "projected_over_budget": bool(budget) and projected > budget,
+    }
+
+
+def spending_analytics(db: Session, user_id, monthly_budget, days=90, window=7, period=30, today=None):
+    today = today or date.today()
+    # one load that covers the series, both comparison periods and the
+    # current month
+    history = max(days, 2 * period, today.day)
+    start = today - timedelta(days=history - 1)
+    day_index, codes, amounts, names = load_spending(db, user_id, start, today)
+
+    n_days = history
+    by_category = np.zeros((len(names), n_days))
+    np.add.at(by_category, (codes, day_index), amounts)
+    daily = by_category.sum(axis=0)
+
+    series_from = n_days - days
+    dates = start + timedelta(days=series_from)
+    # weeks start on Monday
+    week_of = (np.arange(series_from, n_days) + start.weekday()) // 7
+    week_of -= week_of[0]
+    weekly = np.bincount(week_of, weights=daily[series_from:])
+    first_monday = dates - timedelta(days=dates.weekday())
+
+    # rolling mean over the trailing `window` days, from one cumsum per category
+    cumulative = np.concatenate([np.zeros((len(names), 1)), np.cumsum(by_category, axis=1)], axis=1)
+    lower = np.maximum(np.arange(series_from, n_days) + 1 - window, 0)
+    rolling = (cumulative[:, series_from + 1:] - cumulative[:, lower]) / window
+
+    deltas, deltas_total = _period_deltas(by_category, names, n_days, period)
+    return {
+        "start": dates.isoformat(),
+        "end": today.isoformat(),
+        "daily": {
+            "dates": [(dates + timedelta(days=i)).isoformat() for i in range(days)],
+            "spend": _rounded(daily[series_from:]),
+        },
+        "weekly": {
+            "weeks": [(first_monday + timedelta(weeks=i)).isoformat() for i in range(len(weekly))],
+            "spend": _rounded(weekly),
+        },
+        "rolling_average": {
+            "window_days": window,
+            "categories": {name: _rounded(rolling[i]) for i, name in enumerate(names)},
+        },
+        "budget": _burn_down(daily, start, today, monthly_budget or 0.0),
+        "period_over_period": {
+            "period_days": period,
+            "total": deltas_total,
+            "categories": deltas,
+        },
+    }
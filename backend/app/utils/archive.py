@@ -0,0 +1,217 @@
+import os
+import re
+from datetime import date, datetime
+from sqlalchemy import Boolean, DateTime, Float, Integer, func
+from sqlalchemy.orm import Session
+from app.models import PlaidTransaction, Transaction
+from app.utils.versioning import touch
+
+# Cold storage for old transactions. Whole calendar years older than
+# ARCHIVE_AFTER_DAYS are moved out of the hot tables into one zstd Parquet
+# file per user, source and year:
+#
+#   ARCHIVE_DIR/<user_id>/manual-2021.parquet
+#   ARCHIVE_DIR/<user_id>/plaid-2021.parquet
+#
+# The files are the only record of what is archived; a user's archive cutoff
+# is January 1st after their newest archived year. Months before the cutoff
+# keep their category_rollups, which are no longer rebuilt from raw rows.
+# Readers only open segments (memory-mapped) when a query reaches back past
+# the cutoff, and only pyarrow is needed to do so. Archived rows are read-only
+# and keep their database IDs, so feed cursors work across the boundary.
+# With the default horizon the archive stays older than Plaid's 24 month
+# history, so syncs never bring archived rows back; backfills and statement
+# imports skip dates before the cutoff themselves.
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
+ARCHIVE_ROW_GROUP_ROWS = 10000
+DELETE_CHUNK_ROWS = 1000
+
+SOURCES = {
+    "manual": (Transaction, "timestamp"),
+    "plaid": (PlaidTransaction, "date"),
+}
+_SEGMENT = re.compile(r"^(manual|plaid)-(\d{4})\.parquet$")
+
+
+def archive_cutoff(today=None, days=ARCHIVE_AFTER_DAYS):
+    # first day of the oldest year that is still (partly) inside the horizon
+    horizon = (today or date.today()).toordinal() - days
+    return date(date.fromordinal(horizon).year, 1, 1)
+
+
+def _columns(source):
+    model = SOURCES[source][0]
+    return [column for column in model.__table__.columns if column.name != "user_id"]
+
+
+def _schema(source):
+    import pyarrow as pa
+
+    types = {Integer: pa.int64(), Float: pa.float64(), Boolean: pa.bool_(), DateTime: pa.timestamp("us")}
+    return pa.schema([
+        (column.name, next((t for kind, t in types.items() if isinstance(column.type, kind)), pa.string()))
+        for column in _columns(source)
+    ])
+
+
+def segment_path(user_id, source, year):
+    return os.path.join(ARCHIVE_DIR, str(user_id), f"{source}-{year}.parquet")
+
+
+def archived_years(user_id, source=None):
+    try:
+        names = os.listdir(os.path.join(ARCHIVE_DIR, str(user_id)))
+    except FileNotFoundError:
+        return []
+    matches = (_SEGMENT.match(name) for name in names)
+    return sorted(int(m.group(2)) for m in matches if m and source in (None, m.group(1)))
+
+
+def archived_before(user_id):
+    years = archived_years(user_id)
+    return date(years[-1] + 1, 1, 1) if years else None
+
+
+def _date_filter(source, start, end, where):
+    import pyarrow.compute as pc
+
+    date_column = pc.field(SOURCES[source][1])
+    expression = where
+    for condition in (
+        date_column >= start if start is not None else None,
+        date_column < end if end is not None else None,
+    ):
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _years_between(user_id, source, start, end):
+    years = archived_years(user_id, source)
+    return [
+        year for year in years
+        if (start is None or year >= start.year) and (end is None or datetime(year, 1, 1) < end)
+    ]
+
+
+def read_rows(user_id, source, columns=None, start=None, end=None, where=None, newest_first=False, limit=None):
+    # Rows as dicts, start inclusive and end exclusive (datetimes), filtered
+    # by an optional pyarrow expression. With newest_first and limit only as
+    # many yearly segments are opened as it takes to fill the limit.
+    years = _years_between(user_id, source, start, end)
+    if not years:
+        return []
+
+    import pyarrow.parquet as pq
+
+    expression = _date_filter(source, start, end, where)
+    order = "descending" if newest_first else "ascending"
+    rows = []
+    for year in reversed(years) if newest_first else years:
+        table = pq.read_table(segment_path(user_id, source, year), columns=columns, filters=expression, memory_map=True)
+        if limit is not None:
+            table = table.sort_by([(SOURCES[source][1], order), ("id", order)]).slice(0, limit - len(rows))
+        rows.extend(table.to_pylist())
+        if limit is not None and len(rows) >= limit:
+            break
+    return rows
+
+
+def spending(user_id, start, end):
+    # (date, category, amount) of archived positive, visible rows in
+    # [start, end), the same rows the summary and analytics count
+    if not (_years_between(user_id, "manual", start, end) or _years_between(user_id, "plaid", start, end)):
+        return []
+
+    import pyarrow.compute as pc
+
+    manual = read_rows(user_id, "manual", ["timestamp", "category", "amount"], start, end, pc.field("amount") > 0)
+    plaid = read_rows(
+        user_id, "plaid", ["date", "category", "amount"], start, end,
+        (pc.field("amount") > 0) & ~pc.field("is_deleted"),
+    )
+    return [(row["timestamp"], row["category"], row["amount"]) for row in manual] + [
+        (row["date"], row["category"], row["amount"]) for row in plaid
+    ]
+
+
+def archived_hashes(user_id, hashes, end):
+    # the import_hashes among hashes that are in manual segments before end
+    if not hashes or not _years_between(user_id, "manual", None, end):
+        return set()
+
+    import pyarrow.compute as pc
+
+    where = pc.field("import_hash").isin(list(hashes))
+    return {row["import_hash"] for row in read_rows(user_id, "manual", ["import_hash"], end=end, where=where)}
+
+
+def iter_rows(user_id, source, columns=None, batch_rows=ARCHIVE_ROW_GROUP_ROWS):
+    # Every archived row, oldest year first, a record batch at a time.
+    years = archived_years(user_id, source)
+    if not years:
+        return
+
+    import pyarrow.parquet as pq
+
+    for year in years:
+        segment = pq.ParquetFile(segment_path(user_id, source, year), memory_map=True)
+        for batch in segment.iter_batches(batch_size=batch_rows, columns=columns):
+            yield from batch.to_pylist()
+
+
+def write_segment(user_id, source, year, rows):
+    # Merges rows into the year's segment. Rows already in the file with the
+    # same ID are replaced, so re-running after a crash between writing the
+    # file and deleting the rows doesn't duplicate them.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    schema = _schema(source)
+    table = pa.Table.from_pylist(rows, schema=schema)
+    path = segment_path(user_id, source, year)
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True)
+        existing = existing.filter(pc.invert(pc.is_in(existing["id"], value_set=table["id"])))
+        table = pa.concat_tables([existing, table])
+    order = [(SOURCES[source][1], "ascending"), ("id", "ascending")]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".part"
+    pq.write_table(table.sort_by(order), partial, compression="zstd", row_group_size=ARCHIVE_ROW_GROUP_ROWS)
+    os.replace(partial, path)
+    return os.path.getsize(path)
+
+
+def archive_user(db: Session, user_id, cutoff):
+    # Moves the user's rows dated before cutoff (a January 1st) into yearly
+    # segments, committing after each one.
+    counts = {"manual": 0, "plaid": 0, "segments": 0, "bytes": 0}
+    cutoff = datetime.combine(cutoff, datetime.min.time())
+    for source, (model, date_name) in SOURCES.items():
+        date_column = getattr(model, date_name)
+        first = db.query(func.min(date_column)).filter(model.user_id == user_id, date_column < cutoff).scalar()
+        if first is None:
+            continue
+        columns = [getattr(model, column.name) for column in _columns(source)]
+        for year in range(first.year, cutoff.year):
+            rows = [
+                row._asdict() for row in db.query(*columns).filter(
+                    model.user_id == user_id,
+                    date_column >= datetime(year, 1, 1),
+                    date_column < datetime(year + 1, 1, 1),
+                )
+            ]
+            if not rows:
+                continue
+            counts["bytes"] += write_segment(user_id, source, year, rows)
+            ids = [row["id"] for row in rows]
+            for i in range(0, len(ids), DELETE_CHUNK_ROWS):
+                db.query(model).filter(model.id.in_(ids[i:i + DELETE_CHUNK_ROWS])).delete(synchronize_session=False)
+            touch(db, user_id)
+            db.commit()
+            counts[source] += len(rows)
+            counts["segments"] += 1
+    return counts
@@ -0,0 +1,176 @@
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+from app.models import CategoryRule, PlaidTransaction
+from app.utils.cache import TTLCache
+from app.utils import rollups
+from app.utils.versioning import touch
+
+# Maps Plaid transactions to our categories. Rules come in four kinds, tried
+# in this order, and a user's own rules beat the global ones (user_id NULL);
+# category_map is the built-in fallback for the primary category:
+#
+#   merchant         exact merchant name         "starbucks"
+#   merchant_prefix  longest matching prefix     "amazon"  (amazon.com, amazon prime ...)
+#   detailed         Plaid detailed category     "FOOD_AND_DRINK_COFFEE"
+#   primary          Plaid primary category      "FOOD_AND_DRINK"
+#
+# Rules are compiled into dicts plus a character trie for prefixes, so the
+# per-transaction cost doesn't grow with the number of rules. recategorize()
+# re-applies the same precedence to stored history in one UPDATE.
+
+category_map = {
+    "INCOME": "Income",
+    "TRANSFER_IN": "Income",
+    "TRANSFER_OUT": "Transfers",
+    "BANK_FEES": "Fees",
+    "ENTERTAINMENT": "Entertainment",
+    "FOOD_AND_DRINK": "Food",
+    "TRAVEL": "Transportation",
+    "RENT_AND_UTILITIES": "Bills",
+    "LOAN_PAYMENTS": "Debt Payments",
+    "GENERAL_MERCHANDISE": "Shopping",
+    "HOME_IMPROVEMENT": "Home",
+    "MEDICAL": "Health",
+    "PERSONAL_CARE": "Shopping",
+    "GENERAL_SERVICES": "Bills",
+    "GOVERNMENT_AND_NON_PROFIT": "Government",
+    "TRANSPORTATION": "Transportation",
+    "OTHER": "Other"
+}
+UNCATEGORIZED = "Uncategorized"
+RULE_KINDS = ("merchant", "merchant_prefix", "detailed", "primary")
+
+compiled_rules = TTLCache(maxsize=10000, ttl=60)
+
+
+def normalize_pattern(kind, pattern):
+    pattern = pattern.strip()
+    return pattern.lower() if kind in ("merchant", "merchant_prefix") else pattern.upper()
+
+
+class RuleSet:
+    def __init__(self, rules=()):
+        self.merchant = {}
+        self.prefixes = {}
+        self.detailed = {}
+        self.primary = {}
+        for kind, pattern, category in rules:
+            pattern = normalize_pattern(kind, pattern)
+            if kind == "merchant_prefix":
+                node = self.prefixes
+                for char in pattern:
+                    node = node.setdefault(char, {})
+                node[None] = category
+            else:
+                getattr(self, kind)[pattern] = category
+
+    def _longest_prefix(self, merchant):
+        node, found = self.prefixes, None
+        for char in merchant:
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+    def match(self, merchant, detailed, primary):
+        if merchant:
+            category = self.merchant.get(merchant) or self._longest_prefix(merchant)
+            if category:
+                return category
+        return self.detailed.get(detailed) or self.primary.get(primary)
+
+
+class CategoryEngine:
+    def __init__(self, rule_sets):
+        self.rule_sets = rule_sets
+
+    def categorize(self, merchant_name=None, detailed=None, primary=None, default=None):
+        # default beats UNCATEGORIZED when neither a rule nor category_map matches
+        merchant = merchant_name.strip().lower() if merchant_name else None
+        detailed = detailed.upper() if detailed else None
+        primary = primary.upper() if primary else None
+        for rule_set in self.rule_sets:
+            category = rule_set.match(merchant, detailed, primary)
+            if category:
+                return category
+        return category_map.get(primary) or default or UNCATEGORIZED
+
+    def categorize_plaid(self, t):
+        pfc = t.get("personal_finance_category")
+        return self.categorize(
+            # a blank merchant name falls back to the name, as in recategorize
+            (t.get("merchant_name") or "").strip() or t.get("name"),
+            pfc.get("detailed") if pfc else None,
+            pfc.get("primary") if pfc else None,
+        )
+
+
+default_engine = CategoryEngine([])
+
+
+def _rule_set(db: Session, user_id):
+    key = "global" if user_id is None else user_id
+    rule_set = compiled_rules.get(key)
+    if rule_set is None:
+        owner = CategoryRule.user_id.is_(None) if user_id is None else CategoryRule.user_id == user_id
+        rule_set = RuleSet(db.query(CategoryRule.kind, CategoryRule.pattern, CategoryRule.category).filter(owner).all())
+        compiled_rules.set(key, rule_set)
+    return rule_set
+
+
+def engine_for(db: Session, user_id):
+    return CategoryEngine([_rule_set(db, user_id), _rule_set(db, None)])
+
+
+def invalidate_rules(user_id=None):
+    compiled_rules.delete("global" if user_id is None else user_id)
+
+
+def _rule_lookup(kind, owner, column):
+    # correlated subquery: the category of the best `kind` rule matching column
+    rule = select(CategoryRule.category).where(owner, CategoryRule.kind == kind)
+    if kind == "merchant_prefix":
+        rule = rule.where(
+            func.substr(column, 1, func.length(CategoryRule.pattern)) == CategoryRule.pattern
+        ).order_by(func.length(CategoryRule.pattern).desc())
+    else:
+        rule = rule.where(CategoryRule.pattern == column)
+    return rule.limit(1).scalar_subquery()
+
+
+def recategorize(db: Session, user_id):
+    # One set-based UPDATE over the user's Plaid history using the same
+    # precedence as CategoryEngine. Rows stored before we kept Plaid's raw
+    # categories keep their category unless a merchant rule matches.
+    # Rollups are rebuilt if anything moved. Returns the number of rows whose
+    # category changed; does not commit.
+    merchant = func.lower(func.trim(func.coalesce(
+        func.nullif(func.trim(PlaidTransaction.merchant_name), ""), PlaidTransaction.description
+    )))
+    columns = {
+        "merchant": merchant,
+        "merchant_prefix": merchant,
+        "detailed": PlaidTransaction.category_detailed,
+        "primary": PlaidTransaction.category_primary,
+    }
+    lookups = [
+        _rule_lookup(kind, owner, columns[kind])
+        for owner in (CategoryRule.user_id == user_id, CategoryRule.user_id.is_(None))
+        for kind in RULE_KINDS
+    ]
+    fallback = case(
+        (PlaidTransaction.category_primary.is_(None), PlaidTransaction.category),
+        else_=case(category_map, value=PlaidTransaction.category_primary, else_=UNCATEGORIZED),
+    )
+    new_category = func.coalesce(*lookups, fallback)
+    result = db.execute(
+        update(PlaidTransaction)
+        .where(PlaidTransaction.user_id == user_id, PlaidTransaction.category != new_category)
+        .values(category=new_category)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        rollups.rebuild_months(db, user_id)
+        touch(db, user_id)
+    return result.rowcount
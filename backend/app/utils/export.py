@@ -0,0 +1,197 @@
+import csv
+import importlib.util
+import io
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import PlaidTransaction, Transaction, TransactionExport
+from app.utils import archive
+from app.utils.metrics import count_rows
+
+# Full-history exports of a user's manual and Plaid transactions. Rows are
+# read with yield_per (a server-side cursor on PostgreSQL) and written out a
+# chunk at a time, so memory stays fixed however long the history is.
+# GET /transactions/export streams CSV straight to the client; export jobs
+# write CSV or Parquet (needs pyarrow) to EXPORT_DIR for a later download.
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_RETENTION_HOURS = float(os.getenv("EXPORT_RETENTION_HOURS", "24"))
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_COLUMNS = (
+    "source", "id", "date", "amount", "category", "description",
+    "merchant_name", "category_primary", "category_detailed", "is_deleted",
+)
+MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_rows(db: Session, user_id, chunk_rows=EXPORT_CHUNK_ROWS):
+    # (source, id, date, amount, ...) tuples in EXPORT_COLUMNS order:
+    # manual transactions, then Plaid ones including hidden rows, each
+    # followed by their archived segments.
+    manual = db.query(
+        Transaction.id, Transaction.timestamp, Transaction.amount, Transaction.category, Transaction.description
+    ).filter(Transaction.user_id == user_id).order_by(Transaction.timestamp, Transaction.id)
+    for row in manual.yield_per(chunk_rows):
+        count_rows(1)
+        yield ("manual", str(row.id), row.timestamp, row.amount, row.category, row.description, None, None, None, False)
+    for row in archive.iter_rows(user_id, "manual", ["id", "timestamp", "amount", "category", "description"]):
+        yield ("manual", str(row["id"]), row["timestamp"], row["amount"], row["category"], row["description"], None, None, None, False)
+
+    plaid = db.query(
+        PlaidTransaction.transaction_id, PlaidTransaction.date, PlaidTransaction.amount,
+        PlaidTransaction.category, PlaidTransaction.description, PlaidTransaction.merchant_name,
+        PlaidTransaction.category_primary, PlaidTransaction.category_detailed, PlaidTransaction.is_deleted,
+    ).filter(PlaidTransaction.user_id == user_id).order_by(PlaidTransaction.date, PlaidTransaction.id)
+    for row in plaid.yield_per(chunk_rows):
+        count_rows(1)
+        yield ("plaid",) + tuple(row)
+    columns = ["transaction_id", "date", "amount", "category", "description", "merchant_name",
+               "category_primary", "category_detailed", "is_deleted"]
+    for row in archive.iter_rows(user_id, "plaid", columns):
+        yield ("plaid",) + tuple(row[column] for column in columns)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_chunks(rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in _chunks(rows, chunk_rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_csv(user_id):
+    # Streaming outlives the request's get_db session, so read with our own.
+    db = SessionLocal()
+    try:
+        yield from csv_chunks(export_rows(db, user_id))
+    finally:
+        db.close()
+
+
+def write_csv(path, rows):
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_parquet(path, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("source", pa.string()),
+        ("id", pa.string()),
+        ("date", pa.timestamp("us")),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("description", pa.string()),
+        ("merchant_name", pa.string()),
+        ("category_primary", pa.string()),
+        ("category_detailed", pa.string()),
+        ("is_deleted", pa.bool_()),
+    ])
+    count = 0
+    # one row group per chunk
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in _chunks(rows, chunk_rows):
+            columns = [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+            count += len(chunk)
+    return count
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+def expire_exports(db: Session, user_id, now=None):
+    # Removes the user's export files older than EXPORT_RETENTION_HOURS.
+    # Does not commit.
+    cutoff = (now or datetime.now()) - timedelta(hours=EXPORT_RETENTION_HOURS)
+    expired = db.query(TransactionExport).filter(
+        TransactionExport.user_id == user_id,
+        TransactionExport.created_at < cutoff,
+        TransactionExport.path.isnot(None),
+    ).all()
+    for job in expired:
+        if os.path.exists(job.path):
+            os.remove(job.path)
+        job.path = None
+        job.status = "expired"
+    return len(expired)
+
+
+def run_export(job_id):
+    db = SessionLocal()
+    try:
+        job = db.get(TransactionExport, job_id)
+        job.status = "running"
+        db.commit()
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, f"transactions-{job.user_id}-{job.id}.{job.format}")
+        # written under a temporary name so a download never sees half a file
+        partial = path + ".part"
+        try:
+            job.rows = WRITERS[job.format](partial, export_rows(db, job.user_id))
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        job.path = path
+        job.bytes = os.path.getsize(path)
+        job.status = "completed"
+        job.finished_at = datetime.now()
+        db.commit()
+    except Exception:
+        logger.exception("Export %s failed", job_id)
+        db.rollback()
+        job = db.get(TransactionExport, job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = "Export failed"
+            job.finished_at = datetime.now()
+            db.commit()
+    finally:
+        db.close()
+
+
+def job_status(job):
+    return {
+        "id": job.id,
+        "format": job.format,
+        "status": job.status,
+        "rows": job.rows,
+        "bytes": job.bytes,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
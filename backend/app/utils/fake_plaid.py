@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+import random
+import threading
+import time
+
+# In-memory stand-in for the PlaidApi client. It keeps an ordered change log
+# per access token so /transactions/sync cursors behave like the real API:
+# a cursor is just an offset into that log. transactions_get serves the
+# current state of the log. latency/jitter (seconds) are slept per call to
+# imitate the network round trip.
+
+PRIMARY_CATEGORIES = [
+    "INCOME", "TRANSFER_OUT", "BANK_FEES", "ENTERTAINMENT", "FOOD_AND_DRINK",
+    "TRAVEL", "RENT_AND_UTILITIES", "LOAN_PAYMENTS", "GENERAL_MERCHANDISE",
+    "MEDICAL", "PERSONAL_CARE", "TRANSPORTATION", "OTHER",
+]
+MERCHANTS = [
+    "Starbucks", "Uber", "Amazon", "Whole Foods", "Netflix", "Shell",
+    "Target", "Chipotle", "CVS Pharmacy", "Delta Air Lines", "Comcast",
+]
+
+
+def make_transaction(on=None, rng=random):
+    on = on or date.today() - timedelta(days=rng.randint(0, 29))
+    merchant = rng.choice(MERCHANTS)
+    primary = rng.choice(PRIMARY_CATEGORIES)
+    return {
+        "transaction_id": "%032x" % rng.getrandbits(128),
+        "account_id": "acc-checking",
+        "name": merchant,
+        "merchant_name": merchant,
+        "amount": round(rng.uniform(1, 250), 2),
+        "iso_currency_code": "USD",
+        "date": on,
+        "pending": False,
+        "payment_channel": "in store",
+        "personal_finance_category": {"primary": primary, "detailed": f"{primary}_OTHER"},
+    }
+
+
+class FakePlaidClient:
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.changes = {}
+        self.current = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def _log(self, access_token):
+        return self.changes.setdefault(access_token, [])
+
+    def add_transactions(self, access_token, transactions):
+        self._log(access_token).extend(("added", t) for t in transactions)
+        self.current.setdefault(access_token, {}).update((t["transaction_id"], t) for t in transactions)
+
+    def modify_transactions(self, access_token, transactions):
+        self._log(access_token).extend(("modified", t) for t in transactions)
+        self.current.setdefault(access_token, {}).update((t["transaction_id"], t) for t in transactions)
+
+    def remove_transactions(self, access_token, transaction_ids):
+        self._log(access_token).extend(
+            ("removed", {"transaction_id": tid}) for tid in transaction_ids
+        )
+        for tid in transaction_ids:
+            self.current.get(access_token, {}).pop(tid, None)
+
+    def seed_history(self, access_token, count, days=30, rng=random):
+        today = date.today()
+        self.add_transactions(access_token, [
+            make_transaction(on=today - timedelta(days=rng.randint(0, days - 1)), rng=rng)
+            for _ in range(count)
+        ])
+
+    def transactions_get(self, request):
+        self._wait()
+        options = request.get("options") or {}
+        count = options.get("count") or 100
+        offset = options.get("offset") or 0
+        matching = sorted(
+            (
+                t for t in self.current.get(request["access_token"], {}).values()
+                if request["start_date"] <= t["date"] <= request["end_date"]
+            ),
+            key=lambda t: (t["date"], t["transaction_id"]),
+            reverse=True,
+        )
+        return {
+            "accounts": [],
+            "transactions": matching[offset:offset + count],
+            "total_transactions": len(matching),
+        }
+
+    def transactions_sync(self, request):
+        self._wait()
+        log = self._log(request["access_token"])
+        start = int(request.get("cursor") or 0)
+        end = min(start + (request.get("count") or 100), len(log))
+
+        response = {"added": [], "modified": [], "removed": []}
+        for kind, payload in log[start:end]:
+            response[kind].append(payload)
+        response["next_cursor"] = str(end)
+        response["has_more"] = end < len(log)
+        return response
@@ -0,0 +1,126 @@
+from datetime import date, datetime
+import json
+from fastapi.concurrency import iterate_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from app.database import AsyncSessionLocal, SessionLocal
+from app.utils.metrics import count_rows
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+# Serialization for the list endpoints: rows are selected as plain columns,
+# encoded straight to bytes (orjson handles datetimes natively) and streamed
+# in chunks, so large histories never become one big list of dicts/models.
+
+STREAM_CHUNK_ROWS = 1000
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == STREAM_CHUNK_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _rows(build_query, archived):
+    # Streaming outlives the request's get_db session, so read with our own.
+    db = SessionLocal()
+    count = 0
+    try:
+        for row in build_query(db).yield_per(STREAM_CHUNK_ROWS):
+            count += 1
+            yield row._asdict()
+    finally:
+        db.close()
+        count_rows(count)
+    if archived is not None:
+        yield from archived()
+
+
+async def _async_batches(build_query, archived):
+    # DB_ASYNC: the same query, streamed through the async driver. The
+    # sync_session only builds the statement; it never executes anything.
+    async with AsyncSessionLocal() as db:
+        statement = build_query(db.sync_session).statement
+        result = await db.stream(statement.execution_options(yield_per=STREAM_CHUNK_ROWS))
+        async for partition in result.partitions():
+            count_rows(len(partition))
+            yield [row._asdict() for row in partition]
+    if archived is not None:
+        # segments are read from disk, so off the event loop
+        async for batch in iterate_in_threadpool(_batches(archived())):
+            yield batch
+
+
+def _encoder(format, key):
+    # (prefix, encode(batch, first), suffix) for the response format
+    if format == "ndjson":
+        return b"", lambda batch, first: b"\n".join(dumps(row) for row in batch) + b"\n", b""
+
+    def encode(batch, first):
+        body = dumps(batch)[1:-1]
+        return body if first else b"," + body
+
+    prefix, suffix = (b"[", b"]") if key is None else (b'{"' + key.encode() + b'":[', b"]}")
+    return prefix, encode, suffix
+
+
+def _chunks(batches, prefix, encode, suffix):
+    if prefix:
+        yield prefix
+    for i, batch in enumerate(batches):
+        yield encode(batch, i == 0)
+    if suffix:
+        yield suffix
+
+
+async def _async_chunks(batches, prefix, encode, suffix):
+    if prefix:
+        yield prefix
+    first = True
+    async for batch in batches:
+        yield encode(batch, first)
+        first = False
+    if suffix:
+        yield suffix
+
+
+MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+
+def stream_rows(build_query, format="json", key=None, headers=None, archived=None):
+    # build_query(db) must return a query of labelled columns; archived(),
+    # if given, returns dicts with the same keys to stream after them.
+    # format="json" streams a JSON array, wrapped as {key: [...]} when key is
+    # given; format="ndjson" streams one object per line.
+    prefix, encode, suffix = _encoder(format, key)
+    if AsyncSessionLocal is not None:
+        chunks = _async_chunks(_async_batches(build_query, archived), prefix, encode, suffix)
+    else:
+        chunks = _chunks(_batches(_rows(build_query, archived)), prefix, encode, suffix)
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[format], headers=headers)
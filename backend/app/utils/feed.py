@@ -0,0 +1,183 @@
+from datetime import datetime, time, timedelta
+import base64
+import json
+from sqlalchemy import not_
+from sqlalchemy.orm import Session
+from app.models import Transaction, PlaidTransaction
+from app.utils import archive
+from app.utils.metrics import count_rows
+
+# The feed is ordered newest first by (date, source, id). Each table is read
+# with its own keyset predicate and LIMIT, and the two pages are merged here,
+# so a page never costs more than 2 * (limit + 1) rows. Archived segments
+# are read the same way, but only when the page reaches past the user's
+# archive cutoff.
+
+MANUAL = "Manual"
+PLAID = "Plaid"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(item):
+    raw = json.dumps([item["date"], item["source"], item["row_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        when, source, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if source not in (MANUAL, PLAID):
+            raise ValueError(source)
+        return datetime.fromisoformat(when), source, int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def _after_cursor(date_column, id_column, source, cursor):
+    when, cursor_source, cursor_id = cursor
+    if source == cursor_source:
+        # operators rather than or_/and_ so pyarrow expressions work too
+        return (date_column < when) | ((date_column == when) & (id_column < cursor_id))
+    if source < cursor_source:
+        # same-date rows of this source sort after the cursor's source
+        return date_column <= when
+    return date_column < when
+
+
+def _apply_filters(query, date_column, amount_column, category_column, filters):
+    if filters.get("start_date"):
+        query = query.filter(date_column >= datetime.combine(filters["start_date"], time.min))
+    if filters.get("end_date"):
+        query = query.filter(date_column < datetime.combine(filters["end_date"] + timedelta(days=1), time.min))
+    if filters.get("category"):
+        query = query.filter(category_column == filters["category"])
+    if filters.get("min_amount") is not None:
+        query = query.filter(amount_column >= filters["min_amount"])
+    if filters.get("max_amount") is not None:
+        query = query.filter(amount_column <= filters["max_amount"])
+    return query
+
+
+def _manual_page(db: Session, user_id, limit, cursor, filters):
+    query = db.query(
+        Transaction.id,
+        Transaction.amount,
+        Transaction.category,
+        Transaction.description,
+        Transaction.timestamp,
+    ).filter(Transaction.user_id == user_id)
+    query = _apply_filters(query, Transaction.timestamp, Transaction.amount, Transaction.category, filters)
+    if cursor:
+        query = query.filter(_after_cursor(Transaction.timestamp, Transaction.id, MANUAL, cursor))
+    rows = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(limit).all()
+    count_rows(len(rows))
+    return [
+        {
+            "id": row.id,
+            "row_id": row.id,
+            "source": MANUAL,
+            "name": row.description,
+            "description": row.description,
+            "amount": row.amount,
+            "date": row.timestamp.isoformat(),
+            "category": row.category,
+            "is_deleted": False,
+        } for row in rows
+    ]
+
+
+def _plaid_page(db: Session, user_id, limit, cursor, filters):
+    query = db.query(
+        PlaidTransaction.id,
+        PlaidTransaction.transaction_id,
+        PlaidTransaction.amount,
+        PlaidTransaction.category,
+        PlaidTransaction.description,
+        PlaidTransaction.date,
+        PlaidTransaction.is_deleted,
+    ).filter(PlaidTransaction.user_id == user_id)
+    if not filters.get("include_deleted"):
+        query = query.filter(not_(PlaidTransaction.is_deleted))
+    query = _apply_filters(query, PlaidTransaction.date, PlaidTransaction.amount, PlaidTransaction.category, filters)
+    if cursor:
+        query = query.filter(_after_cursor(PlaidTransaction.date, PlaidTransaction.id, PLAID, cursor))
+    rows = query.order_by(PlaidTransaction.date.desc(), PlaidTransaction.id.desc()).limit(limit).all()
+    count_rows(len(rows))
+    return [
+        {
+            "id": row.transaction_id,
+            "row_id": row.id,
+            "source": PLAID,
+            "name": row.description,
+            "description": row.description,
+            "amount": row.amount,
+            "date": row.date.isoformat(),
+            "category": row.category,
+            "is_deleted": bool(row.is_deleted),
+        } for row in rows
+    ]
+
+
+def _archived_page(user_id, limit, cursor, filters):
+    import pyarrow.compute as pc
+
+    start = datetime.combine(filters["start_date"], time.min) if filters.get("start_date") else None
+    end = datetime.combine(filters["end_date"] + timedelta(days=1), time.min) if filters.get("end_date") else None
+    conditions = []
+    if filters.get("category"):
+        conditions.append(pc.field("category") == filters["category"])
+    if filters.get("min_amount") is not None:
+        conditions.append(pc.field("amount") >= filters["min_amount"])
+    if filters.get("max_amount") is not None:
+        conditions.append(pc.field("amount") <= filters["max_amount"])
+
+    items = []
+    for source, feed_source, date_name in (("manual", MANUAL, "timestamp"), ("plaid", PLAID, "date")):
+        where = list(conditions)
+        if source == "plaid" and not filters.get("include_deleted"):
+            where.append(~pc.field("is_deleted"))
+        if cursor:
+            where.append(_after_cursor(pc.field(date_name), pc.field("id"), feed_source, cursor))
+        expression = None
+        for condition in where:
+            expression = condition if expression is None else expression & condition
+        for row in archive.read_rows(user_id, source, None, start, end, expression, newest_first=True, limit=limit):
+            items.append({
+                "id": row["id"] if source == "manual" else row["transaction_id"],
+                "row_id": row["id"],
+                "source": feed_source,
+                "name": row["description"],
+                "description": row["description"],
+                "amount": row["amount"],
+                "date": row[date_name].isoformat(),
+                "category": row["category"],
+                "is_deleted": bool(row.get("is_deleted")),
+            })
+    return items
+
+
+def query_feed(db: Session, user_id, limit, cursor=None, **filters):
+    position = decode_cursor(cursor) if cursor else None
+    items = _manual_page(db, user_id, limit + 1, position, filters)
+    items += _plaid_page(db, user_id, limit + 1, position, filters)
+    items.sort(key=lambda item: (item["date"], item["source"], item["row_id"]), reverse=True)
+
+    # archived rows are all older than the cutoff, so they can only matter
+    # if the hot tables can't fill the page with newer rows
+    cutoff = archive.archived_before(user_id)
+    if cutoff is not None:
+        boundary = datetime.combine(cutoff, time.min)
+        filled = len(items) > limit and datetime.fromisoformat(items[limit]["date"]) >= boundary
+        after_cutoff = filters.get("start_date") and filters["start_date"] >= cutoff
+        if not filled and not after_cutoff:
+            items += _archived_page(user_id, limit + 1, position, filters)
+            items.sort(key=lambda item: (item["date"], item["source"], item["row_id"]), reverse=True)
+
+    page = items[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(items) > limit else None
+    for item in page:
+        del item["row_id"]
+    return {"transactions": page, "next_cursor": next_cursor}
@@ -0,0 +1,85 @@
+import re
+import threading
+import time
+from app.utils.cache import TTLCache
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+DEFAULT_CERT_MAX_AGE = 3600
+CLOCK_SKEW_SECONDS = 10
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def cache_max_age(cache_control, default=DEFAULT_CERT_MAX_AGE):
+    match = _MAX_AGE.search(cache_control or "")
+    return int(match.group(1)) if match else default
+
+
+class GoogleCertCache:
+    # Google's signing certs rotate roughly daily and are served with a
+    # Cache-Control max-age; fetch them once per max-age over one session.
+
+    def __init__(self, url=GOOGLE_CERTS_URL, session=None):
+        self.url = url
+        self.session = session
+        self._certs = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def get(self, force=False):
+        if not force and self._certs is not None and time.monotonic() < self._expires:
+            return self._certs
+        with self._lock:
+            # another thread may have refreshed while we waited
+            if not force and self._certs is not None and time.monotonic() < self._expires:
+                return self._certs
+            if self.session is None:
+                # requests is only imported once the first login comes in
+                import requests
+                self.session = requests.Session()
+            response = self.session.get(self.url, timeout=10)
+            response.raise_for_status()
+            self._certs = response.json()
+            self._expires = time.monotonic() + cache_max_age(response.headers.get("Cache-Control"))
+            self.fetches += 1
+            return self._certs
+
+
+cert_cache = GoogleCertCache()
+verified_tokens = TTLCache(maxsize=10000, ttl=300)
+
+
+def _decode(token, certs, audience):
+    from google.auth import jwt as google_jwt #type: ignore
+
+    idinfo = google_jwt.decode(
+        token, certs=certs, audience=audience, clock_skew_in_seconds=CLOCK_SKEW_SECONDS
+    )
+    if idinfo.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+    return idinfo
+
+
+def verify_google_token(token, audience, certs=None):
+    # Pass certs ({key id: PEM}) to verify offline, e.g. with locally
+    # generated keys; otherwise Google's published certs are used.
+    if certs is not None:
+        return _decode(token, certs, audience)
+
+    idinfo = verified_tokens.get(token)
+    if idinfo is not None:
+        return idinfo
+    try:
+        idinfo = _decode(token, cert_cache.get(), audience)
+    except ValueError as e:
+        # a key we haven't seen yet means Google rotated before our max-age ran out
+        if "Certificate for key id" not in str(e):
+            raise
+        idinfo = _decode(token, cert_cache.get(force=True), audience)
+
+    ttl = idinfo.get("exp", 0) - time.time()
+    if ttl > 0:
+        verified_tokens.set(token, idinfo, ttl)
+    return idinfo
@@ -0,0 +1,279 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-route request metrics in Prometheus text format: latency histograms,
+# SQL statement count/time, rows written and read back, and time spent in
+# outbound Plaid calls.
+# Stats for the current request live in a ContextVar; Starlette copies the
+# context into the threadpool, so sync handlers and the SQLAlchemy hooks
+# update the same object as the middleware.
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+class RequestStats:
+    def __init__(self):
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.sql_rows_affected = 0
+        self.sql_rows_returned = 0
+        self.plaid_calls = 0
+        self.plaid_seconds = 0.0
+        self.threads = {threading.get_ident()}
+        self.samples = None
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = defaultdict(lambda: defaultdict(Histogram))
+        self.counters = defaultdict(lambda: defaultdict(float))
+        self.help = {}
+
+    def observe(self, name, labels, value, help_text=""):
+        with self._lock:
+            self.help.setdefault(name, help_text)
+            self.histograms[name][labels].observe(value)
+
+    def inc(self, name, labels, value=1, help_text=""):
+        with self._lock:
+            self.help.setdefault(name, help_text)
+            self.counters[name][labels] += value
+
+    def render(self, extra_gauges=()):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    base = _labels(labels)
+                    # counts are already cumulative per bucket
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", repr(bound)),))} {count}')
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f"{name}_sum{base} {histogram.sum}")
+                    lines.append(f"{name}_count{base} {histogram.count}")
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        for name, help_text, series in extra_gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in series:
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = Registry()
+
+
+@contextmanager
+def track_plaid(operation):
+    stats = _current.get()
+    if stats is not None:
+        stats.threads.add(threading.get_ident())
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe("vint_plaid_call_duration_seconds", (("operation", operation),), elapsed,
+                         "Outbound Plaid API call latency")
+        if stats is not None:
+            stats.plaid_calls += 1
+            stats.plaid_seconds += elapsed
+
+
+def count_rows(n):
+    # Rows read back from the database for the current request. Drivers
+    # don't report that for SELECTs, so the code that iterates the results
+    # (listings, feed, summary, export) reports it here.
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_rows_returned += n
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.threads.add(threading.get_ident())
+    stats.sql_statements += 1
+    stats.sql_seconds += elapsed
+    # rowcount only means rows written for DML; for SELECTs it is -1 or
+    # driver-specific
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete) and cursor.rowcount > 0:
+        stats.sql_rows_affected += cursor.rowcount
+
+
+def instrument_sqlalchemy():
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class Sampler:
+    # Opt-in sampling profiler. While any request is in flight it samples the
+    # stacks of the threads that request has run on and, for requests slower
+    # than PROFILE_SLOW_MS, writes them as folded stacks (flamegraph.pl,
+    # speedscope) to PROFILE_DIR.
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, stats):
+        stats.samples = Counter()
+        with self._lock:
+            self.active.add(stats)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, stats):
+        with self._lock:
+            self.active.discard(stats)
+
+    def _run(self):
+        while True:
+            # clear before checking so a start() racing with us isn't lost
+            self._wake.clear()
+            with self._lock:
+                active = list(self.active)
+            if not active:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for stats in active:
+                for ident in list(stats.threads):
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stats.samples[_fold(frame)] += 1
+            time.sleep(self.interval)
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+sampler = Sampler(PROFILE_INTERVAL_MS / 1000) if PROFILE_SLOW_MS > 0 else None
+
+
+def _dump_profile(method, route, elapsed, samples):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{method}-{slug}-{int(elapsed * 1000)}ms.folded")
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    logger.info("Slow request %s %s took %.0fms, profile written to %s", method, route, elapsed * 1000, path)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        if sampler is not None:
+            sampler.start(stats)
+        started = time.perf_counter()
+        status_code = 500
+        finished = None
+
+        async def send_wrapper(message):
+            nonlocal status_code, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                # stop the clock at the last body chunk, before background tasks
+                finished = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if sampler is not None:
+                sampler.stop(stats)
+            elapsed = (finished or time.perf_counter()) - started
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            self._record(scope["method"], route, status_code, elapsed, stats)
+
+    def _record(self, method, route, status_code, elapsed, stats):
+        labels = (("method", method), ("route", route))
+        registry.observe("vint_http_request_duration_seconds", labels, elapsed, "Request latency by route")
+        registry.inc("vint_http_requests_total", labels + (("status", status_code),), 1, "Requests by route and status")
+        registry.inc("vint_db_statements_total", labels, stats.sql_statements, "SQL statements executed")
+        registry.inc("vint_db_seconds_total", labels, stats.sql_seconds, "Time spent executing SQL")
+        registry.inc("vint_db_rows_returned_total", labels, stats.sql_rows_returned, "Rows read back from the database")
+        registry.inc("vint_db_rows_affected_total", labels, stats.sql_rows_affected, "Rows inserted, updated or deleted, as reported by the DB driver")
+        registry.inc("vint_plaid_calls_total", labels, stats.plaid_calls, "Outbound Plaid calls")
+        registry.inc("vint_plaid_seconds_total", labels, stats.plaid_seconds, "Time spent in outbound Plaid calls")
+        if sampler is not None and stats.samples and elapsed * 1000 >= PROFILE_SLOW_MS:
+            _dump_profile(method, route, elapsed, stats.samples)
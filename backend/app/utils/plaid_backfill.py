@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import PlaidBackfillCheckpoint, User
+from app.utils import archive, plaid_client
+from app.utils.metrics import track_plaid
+from app.utils.plaid_sync import apply_sync_deltas
+
+# Full-history import through /transactions/get. The range is cut into
+# calendar-month windows that are fetched concurrently; within a window
+# pages are walked with count/offset until total_transactions is reached.
+# Each page is upserted and committed together with its window's checkpoint,
+# so an interrupted backfill resumes at the first page it hadn't stored.
+
+BACKFILL_PAGE_SIZE = 500  # the most transactions_get returns per call
+
+
+def month_windows(start, end):
+    windows = []
+    window_start = start
+    while window_start <= end:
+        following = (window_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        windows.append((window_start, min(end, following - timedelta(days=1))))
+        window_start = following
+    return windows
+
+
+def pending_windows(db: Session, user_id, start, end, restart=False):
+    # Creates checkpoints for windows we haven't seen and returns the ones
+    # still to do, oldest first. Archived years are never fetched again.
+    cutoff = archive.archived_before(user_id)
+    if cutoff is not None and start < cutoff:
+        start = cutoff
+    windows = month_windows(start, end)
+    checkpoints = {
+        (c.window_start, c.window_end): c
+        for c in db.query(PlaidBackfillCheckpoint).filter(
+            PlaidBackfillCheckpoint.user_id == user_id,
+            PlaidBackfillCheckpoint.window_start >= start,
+            PlaidBackfillCheckpoint.window_end <= end,
+        )
+    }
+    pending = []
+    for window in windows:
+        checkpoint = checkpoints.get(window)
+        if checkpoint is None:
+            db.add(PlaidBackfillCheckpoint(user_id=user_id, window_start=window[0], window_end=window[1]))
+        elif restart:
+            checkpoint.next_offset = 0
+            checkpoint.total_transactions = None
+            checkpoint.completed_at = None
+        elif checkpoint.completed_at is not None:
+            continue
+        pending.append(window)
+    db.commit()
+    return pending
+
+
+def fetch_page(plaid, access_token, window, offset, count=BACKFILL_PAGE_SIZE):
+    request = TransactionsGetRequest(
+        access_token=access_token,
+        start_date=window[0],
+        end_date=window[1],
+        options=TransactionsGetRequestOptions(count=count, offset=offset),
+    )
+    with track_plaid("transactions_get"):
+        response = plaid.transactions_get(request)
+    return response["transactions"], response["total_transactions"]
+
+
+def backfill_window(user_id, window, plaid=None, page_size=BACKFILL_PAGE_SIZE):
+    plaid = plaid or plaid_client.get_client()
+    counts = {"pages": 0, "inserted": 0, "updated": 0}
+    db = SessionLocal()
+    try:
+        access_token = db.query(User.plaid_access_token).filter(User.id == user_id).scalar()
+        checkpoint = db.query(PlaidBackfillCheckpoint).filter_by(
+            user_id=user_id, window_start=window[0], window_end=window[1]
+        ).one()
+        if not access_token or checkpoint.completed_at is not None:
+            return counts
+
+        while True:
+            transactions, total = fetch_page(plaid, access_token, window, checkpoint.next_offset, page_size)
+            page_counts = apply_sync_deltas(db, user_id, transactions, [], [])
+            checkpoint.next_offset += len(transactions)
+            checkpoint.total_transactions = total
+            if not transactions or checkpoint.next_offset >= total:
+                checkpoint.completed_at = datetime.now()
+            db.commit()
+
+            counts["pages"] += 1
+            counts["inserted"] += page_counts["inserted"]
+            counts["updated"] += page_counts["updated"]
+            if checkpoint.completed_at is not None:
+                return counts
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def backfill_user(user_id, start, end=None, plaid=None, workers=4, restart=False):
+    end = end or date.today()
+    db = SessionLocal()
+    try:
+        windows = pending_windows(db, user_id, start, end, restart)
+    finally:
+        db.close()
+
+    totals = {"windows": len(windows), "pages": 0, "inserted": 0, "updated": 0}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plaid-backfill") as pool:
+        for counts in pool.map(lambda window: backfill_window(user_id, window, plaid), windows):
+            for key, value in counts.items():
+                totals[key] += value
+    return totals
@@ -1,20 +1,44 @@
 import os
-from plaid.api import plaid_api 
-from plaid.model.link_token_create_request import LinkTokenCreateRequest
-from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-from plaid.configuration import Configuration
-from plaid.api_client import ApiClient
-from dotenv import load_dotenv
-
-load_dotenv()
-
-configuration = Configuration(
-    host="https://sandbox.plaid.com",
-    api_key={
-        "clientId": os.getenv("PLAID_CLIENT_ID"),
-        "secret": os.getenv("PLAID_SECRET")
-    }
-)
-
-api_client = ApiClient(configuration)
-client = plaid_api.PlaidApi(api_client)
\ No newline at end of file
+import threading
+
+# The plaid SDK is large, so it is imported and the client built on first use
+# rather than when the app starts.
+# PLAID_HOST can point at a local fake server (benchmarks/fake_plaid_server.py).
+PLAID_HOST = os.getenv("PLAID_HOST", "https://sandbox.plaid.com")
+PLAID_POOL_SIZE = int(os.getenv("PLAID_POOL_SIZE", "5"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def make_client(host=None, pool_size=None):
+    # One ApiClient holds one urllib3 pool that is safe to share across
+    # threads; size it to the number of threads calling through it.
+    from plaid.api import plaid_api
+    from plaid.api_client import ApiClient
+    from plaid.configuration import Configuration
+
+    configuration = Configuration(
+        host=host or PLAID_HOST,
+        api_key={
+            "clientId": os.getenv("PLAID_CLIENT_ID"),
+            "secret": os.getenv("PLAID_SECRET")
+        }
+    )
+    configuration.connection_pool_maxsize = pool_size or PLAID_POOL_SIZE
+    return plaid_api.PlaidApi(ApiClient(configuration))
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = make_client()
+    return _client
+
+
+def set_client(client):
+    # swap in another client, e.g. FakePlaidClient in tests and benchmarks
+    global _client
+    _client = client
@@ -0,0 +1,67 @@
+from sqlalchemy import insert, literal_column, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models import PlaidTransaction
+
+INGEST_CHUNK_SIZE = 500
+UPSERT_COLUMNS = (
+    "category", "description", "amount", "date",
+    "merchant_name", "category_primary", "category_detailed",
+)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _upsert_chunk_postgres(db: Session, chunk):
+    stmt = pg_insert(PlaidTransaction).values(chunk)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PlaidTransaction.transaction_id],
+        set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS},
+        # never let one user's row overwrite another's
+        where=PlaidTransaction.user_id == stmt.excluded.user_id,
+    ).returning(literal_column("xmax = 0"))
+    flags = db.execute(stmt).scalars().all()
+    inserted = sum(1 for flag in flags if flag)
+    return inserted, len(flags) - inserted
+
+
+def _upsert_chunk_generic(db: Session, chunk):
+    # SQLite and friends: look up only this chunk's IDs, then one
+    # executemany INSERT for new rows and one bulk UPDATE by primary key.
+    existing = dict(
+        db.query(PlaidTransaction.transaction_id, PlaidTransaction.id)
+        .filter(
+            PlaidTransaction.user_id == chunk[0]["user_id"],
+            PlaidTransaction.transaction_id.in_([row["transaction_id"] for row in chunk])
+        )
+        .all()
+    )
+    new_rows = [row for row in chunk if row["transaction_id"] not in existing]
+    changed_rows = [
+        {"id": existing[row["transaction_id"]], **{column: row[column] for column in UPSERT_COLUMNS}}
+        for row in chunk if row["transaction_id"] in existing
+    ]
+    if new_rows:
+        db.execute(insert(PlaidTransaction), new_rows)
+    if changed_rows:
+        db.execute(update(PlaidTransaction), changed_rows)
+    return len(new_rows), len(changed_rows)
+
+
+def upsert_plaid_transactions(db: Session, rows, chunk_size=INGEST_CHUNK_SIZE):
+    # rows are plain dicts for a single user, already deduped by transaction_id.
+    # Does not commit; the caller owns the transaction.
+    if db.get_bind().dialect.name == "postgresql":
+        upsert_chunk = _upsert_chunk_postgres
+    else:
+        upsert_chunk = _upsert_chunk_generic
+
+    inserted = updated = 0
+    for chunk in _chunks(list(rows), chunk_size):
+        chunk_inserted, chunk_updated = upsert_chunk(db, chunk)
+        inserted += chunk_inserted
+        updated += chunk_updated
+    return {"inserted": inserted, "updated": updated}
@@ -0,0 +1,154 @@
+from datetime import date, datetime
+from sqlalchemy.orm import Session
+from app.models import PlaidTransaction, User
+from app.utils.plaid_client import get_client
+from app.utils.plaid_ingest import upsert_plaid_transactions
+from app.utils import rollups
+from app.utils.categorize import default_engine, engine_for
+from app.utils.metrics import track_plaid
+from app.utils.versioning import touch
+import json
+
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_RESTARTS = 3
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(value)
+
+
+def transaction_row(user_id, t, engine=None):
+    pfc = t.get("personal_finance_category")
+    return {
+        "transaction_id": t["transaction_id"],
+        "user_id": user_id,
+        "category": (engine or default_engine).categorize_plaid(t),
+        "description": t.get("name"),
+        "amount": t.get("amount"),
+        "date": _to_datetime(t.get("date")),
+        "merchant_name": t.get("merchant_name"),
+        "category_primary": pfc.get("primary") if pfc else None,
+        "category_detailed": pfc.get("detailed") if pfc else None,
+    }
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _is_mutation_during_pagination(e):
+    try:
+        return json.loads(e.body).get("error_code") == "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def fetch_sync_deltas(access_token, cursor=None, plaid=None):
+    # Pages through /transactions/sync starting at cursor. Plaid asks callers
+    # to restart from the original cursor if the data changes mid-pagination.
+    from plaid.exceptions import ApiException
+    from plaid.model.transactions_sync_request import TransactionsSyncRequest
+
+    plaid = plaid or get_client()
+    for _ in range(MAX_SYNC_RESTARTS):
+        added, modified, removed = [], [], []
+        next_cursor = cursor
+        has_more = True
+        try:
+            while has_more:
+                request_args = {"access_token": access_token, "count": SYNC_PAGE_SIZE}
+                if next_cursor:
+                    request_args["cursor"] = next_cursor
+                with track_plaid("transactions_sync"):
+                    response = plaid.transactions_sync(TransactionsSyncRequest(**request_args))
+                added.extend(response["added"])
+                modified.extend(response["modified"])
+                removed.extend(r["transaction_id"] for r in response["removed"])
+                has_more = response["has_more"]
+                next_cursor = response["next_cursor"]
+        except ApiException as e:
+            if _is_mutation_during_pagination(e):
+                continue
+            raise
+        return added, modified, removed, next_cursor
+    raise RuntimeError("Plaid sync kept changing during pagination")
+
+
+def apply_sync_deltas(db: Session, user_id, added, modified, removed):
+    # Later entries win so a transaction added then modified in the same
+    # batch ends up with its modified values. Plaid never reuses a removed
+    # ID, so a removal always beats an add or modify for it.
+    engine = engine_for(db, user_id)
+    rows = {}
+    for t in list(added) + list(modified):
+        rows[t["transaction_id"]] = transaction_row(user_id, t, engine)
+    removed_ids = list(removed)
+    for transaction_id in removed_ids:
+        rows.pop(transaction_id, None)
+
+    # Months whose rollups change: where the rows land now, plus where
+    # modified and removed rows used to be.
+    months = {rollups.month_start(row["date"]) for row in rows.values()}
+    for chunk in _chunks(list(rows) + removed_ids, SYNC_PAGE_SIZE):
+        months.update(
+            rollups.month_start(previous.date)
+            for previous in db.query(PlaidTransaction.date).filter(
+                PlaidTransaction.user_id == user_id,
+                PlaidTransaction.transaction_id.in_(chunk)
+            )
+        )
+
+    counts = upsert_plaid_transactions(db, rows.values())
+
+    counts["removed"] = 0
+    for chunk in _chunks(removed_ids, SYNC_PAGE_SIZE):
+        counts["removed"] += db.query(PlaidTransaction).filter(
+            PlaidTransaction.user_id == user_id,
+            PlaidTransaction.transaction_id.in_(chunk)
+        ).delete(synchronize_session=False)
+
+    rollups.rebuild_months(db, user_id, months)
+    if rows or counts["removed"]:
+        touch(db, user_id)
+    return counts
+
+
+def sync_transactions(db: Session, user: User, plaid=None):
+    # The Plaid round trips run outside any transaction, so nothing is
+    # locked while we wait on the network (or on rate-limit backoff). The
+    # new cursor is then claimed with a compare-and-swap UPDATE on the users
+    # row, which takes the row lock on PostgreSQL and the write lock on
+    # SQLite, and the deltas are stored in the same transaction. If another
+    # worker moved the cursor meanwhile the claim matches no row and we
+    # fetch again from their cursor.
+    user_id = user.id
+    for _ in range(MAX_SYNC_RESTARTS):
+        access_token = user.plaid_access_token
+        cursor = user.plaid_sync_cursor
+        if not access_token:
+            return {"inserted": 0, "updated": 0, "removed": 0}
+        db.rollback()
+
+        added, modified, removed, next_cursor = fetch_sync_deltas(access_token, cursor, plaid)
+        try:
+            claimed = db.query(User).filter(
+                User.id == user_id,
+                User.plaid_access_token == access_token,
+                User.plaid_sync_cursor == cursor,
+            ).update({User.plaid_sync_cursor: next_cursor}, synchronize_session=False)
+            if not claimed:
+                db.rollback()
+                user = db.query(User).filter(User.id == user_id).populate_existing().one()
+                continue
+            counts = apply_sync_deltas(db, user_id, added, modified, removed)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return counts
+    raise RuntimeError("Plaid sync cursor kept moving")
@@ -0,0 +1,85 @@
+import json
+import random
+import threading
+import time
+from plaid.exceptions import ApiException
+
+# Client-side throttling for batch jobs that fan out over many Plaid items:
+# a token bucket shared by every worker thread keeps the aggregate request
+# rate under our Plaid limit, and rate-limit errors that still get through
+# are retried with exponential backoff.
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+
+def is_rate_limited(e):
+    if not isinstance(e, ApiException):
+        return False
+    if e.status == 429:
+        return True
+    try:
+        return json.loads(e.body).get("error_type") == "RATE_LIMIT_EXCEEDED"
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+class RateLimitedClient:
+    # Wraps a PlaidApi so every call takes a token first and rate-limit
+    # errors are retried after base_delay * 2**attempt (plus jitter, so the
+    # workers don't all come back at once).
+
+    def __init__(self, client, bucket, max_retries=5, base_delay=1.0, max_delay=60.0):
+        self.client = client
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _count(self, retry=False):
+        with self._lock:
+            self.calls += 1
+            if retry:
+                self.retries += 1
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            for attempt in range(self.max_retries + 1):
+                self.bucket.acquire()
+                self._count(retry=attempt > 0)
+                try:
+                    return method(*args, **kwargs)
+                except ApiException as e:
+                    if not is_rate_limited(e) or attempt == self.max_retries:
+                        raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+        return call
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import threading
+from fastapi.concurrency import run_in_threadpool
+from app.utils.cache import TTLCache
+
+try:
+    import redis
+except ImportError:  # optional, only needed for the shared backend
+    redis = None
+
+# Cache for computed results such as /transactions/summary. Keys carry the
+# user's data_version, so a write makes the old entries unreachable instead
+# of having to find and delete them; the TTL only bounds how long they linger.
+# The default backend is per worker. With REDIS_URL set (and redis installed)
+# every worker and replica shares one copy.
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "10000"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+class LocalBackend:
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class RedisBackend:
+    def __init__(self, url, ttl=RESULT_CACHE_TTL, prefix="vint:"):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            # an unreachable cache must not take the endpoint down with it
+            logger.warning("Result cache read failed: %s", e)
+            raw = None
+        self._count(raw is not None)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+        except redis.RedisError as e:
+            logger.warning("Result cache write failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            # entries live in redis, so this worker can't cheaply count them
+            return {
+                "size": None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def make_backend(url=REDIS_URL):
+    if url:
+        if redis is not None:
+            return RedisBackend(url)
+        logger.warning("REDIS_URL is set but redis is not installed, caching results per worker")
+    return LocalBackend()
+
+
+class ResultCache:
+    def __init__(self, namespace, backend=None):
+        self.namespace = namespace
+        self.backend = backend or make_backend()
+
+    def key(self, user_id, version, *variant):
+        return ":".join(str(part) for part in (self.namespace, user_id, version, *variant))
+
+    def get_or_compute(self, key, compute):
+        value = self.backend.get(key)
+        if value is None:
+            value = compute()
+            self.backend.set(key, value)
+        return value
+
+    async def get_or_compute_async(self, key, compute):
+        # compute is a coroutine function; the backend can block (Redis),
+        # so it is called from the threadpool
+        value = await run_in_threadpool(self.backend.get, key)
+        if value is None:
+            value = await compute()
+            await run_in_threadpool(self.backend.set, key, value)
+        return value
+
+    def stats(self):
+        return self.backend.stats()
+
+
+summary_cache = ResultCache("summary")
+analytics_cache = ResultCache("analytics", summary_cache.backend)
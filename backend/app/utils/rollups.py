@@ -0,0 +1,200 @@
+from datetime import date, datetime
+from sqlalchemy import and_, func, insert, not_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import CategoryRollup, Transaction, PlaidTransaction
+from app.utils import archive
+from app.utils.metrics import count_rows
+
+# category_rollups holds SUM(amount) of positive amounts per
+# (user, month, category) across manual and visible Plaid transactions.
+# Single-row writes apply a delta; bulk writes (Plaid ingest) rebuild the
+# months they touched. Months before a user's archive cutoff are never
+# rebuilt, since most of their rows now live in archived segments.
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def contribution(amount):
+    return amount if amount and amount > 0 else 0
+
+
+def _add_totals(db: Session, rows):
+    # rows: {user_id, month, category, total} dicts, added onto any existing
+    # rollup. A single upsert, so two writers creating the same key at once
+    # can't trip over unique_user_month_category.
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(CategoryRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CategoryRollup.user_id, CategoryRollup.month, CategoryRollup.category],
+            set_={"total": CategoryRollup.total + stmt.excluded.total},
+        )
+        db.execute(stmt, rows)
+        return
+    for row in rows:
+        updated = db.query(CategoryRollup).filter_by(
+            user_id=row["user_id"], month=row["month"], category=row["category"]
+        ).update({CategoryRollup.total: CategoryRollup.total + row["total"]}, synchronize_session=False)
+        if not updated:
+            db.execute(insert(CategoryRollup), [row])
+
+
+def apply_delta(db: Session, user_id, when, category, delta):
+    if not delta:
+        return
+    _add_totals(db, [{"user_id": user_id, "month": month_start(when), "category": category, "total": delta}])
+
+
+def apply_deltas(db: Session, user_id, deltas):
+    # deltas: {(month, category): delta}, written in one statement
+    rows = [
+        {"user_id": user_id, "month": month, "category": category, "total": delta}
+        for (month, category), delta in deltas.items() if delta
+    ]
+    if rows:
+        _add_totals(db, rows)
+
+
+def add_transaction(db: Session, user_id, when, category, amount):
+    apply_delta(db, user_id, when, category, contribution(amount))
+
+
+def remove_transaction(db: Session, user_id, when, category, amount):
+    apply_delta(db, user_id, when, category, -contribution(amount))
+
+
+def _month_expression(db: Session, column):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return func.date_trunc("month", column)
+    if dialect == "sqlite":
+        return func.date(column, "start of month")
+    return None
+
+
+def _as_month(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return month_start(value)
+
+
+def _month_totals(db: Session, model, date_column, conditions, months):
+    if months is not None:
+        conditions = conditions + [or_(*[
+            and_(date_column >= datetime.combine(m, datetime.min.time()),
+                 date_column < datetime.combine(next_month(m), datetime.min.time()))
+            for m in months
+        ])]
+    month_expression = _month_expression(db, date_column)
+    if month_expression is None:
+        totals = {}
+        for when, category, amount in db.query(date_column, model.category, model.amount).filter(*conditions):
+            key = (month_start(when), category)
+            totals[key] = totals.get(key, 0) + amount
+        return totals
+    rows = (
+        db.query(month_expression, model.category, func.sum(model.amount))
+        .filter(*conditions)
+        .group_by(month_expression, model.category)
+    )
+    return {(_as_month(month), category): float(total) for month, category, total in rows}
+
+
+def rebuild_months(db: Session, user_id, months=None):
+    # months=None rebuilds the user's whole (unarchived) history
+    cutoff = archive.archived_before(user_id)
+    if months is not None:
+        months = sorted({month for month in months if cutoff is None or month >= cutoff})
+        if months == []:
+            return
+    since = datetime.combine(cutoff, datetime.min.time()) if cutoff is not None and months is None else None
+
+    manual_conditions = [Transaction.user_id == user_id, Transaction.amount > 0]
+    plaid_conditions = [
+        PlaidTransaction.user_id == user_id,
+        PlaidTransaction.amount > 0,
+        not_(PlaidTransaction.is_deleted),
+    ]
+    if since is not None:
+        manual_conditions.append(Transaction.timestamp >= since)
+        plaid_conditions.append(PlaidTransaction.date >= since)
+    totals = _month_totals(db, Transaction, Transaction.timestamp, manual_conditions, months)
+    plaid_totals = _month_totals(db, PlaidTransaction, PlaidTransaction.date, plaid_conditions, months)
+    for key, total in plaid_totals.items():
+        totals[key] = totals.get(key, 0) + total
+
+    stale = db.query(CategoryRollup).filter(CategoryRollup.user_id == user_id)
+    if months is not None:
+        stale = stale.filter(CategoryRollup.month.in_(months))
+    elif cutoff is not None:
+        stale = stale.filter(CategoryRollup.month >= cutoff)
+    stale.delete(synchronize_session=False)
+    if totals:
+        # a concurrent apply_delta may have re-created a key after the delete;
+        # its delta isn't in our totals, so add to it rather than fail
+        _add_totals(db, [
+            {"user_id": user_id, "month": month, "category": category, "total": total}
+            for (month, category), total in totals.items()
+        ])
+
+
+def summarize(db: Session, user_id, start):
+    # Whole months come from the rollups; only the partial first month is
+    # scanned from the raw tables.
+    rollup_from = month_start(start)
+    summary = {}
+    if start != datetime.combine(rollup_from, datetime.min.time()):
+        rollup_from = next_month(rollup_from)
+        partial_end = datetime.combine(rollup_from, datetime.min.time())
+        manual_results = (
+            db.query(Transaction.category, func.sum(Transaction.amount))
+            .filter(
+                Transaction.user_id == user_id,
+                Transaction.timestamp >= start,
+                Transaction.timestamp < partial_end,
+                Transaction.amount > 0
+            )
+            .group_by(Transaction.category)
+            .all()
+        )
+        plaid_results = (
+            db.query(PlaidTransaction.category, func.sum(PlaidTransaction.amount))
+            .filter(
+                PlaidTransaction.user_id == user_id,
+                PlaidTransaction.date >= start,
+                PlaidTransaction.date < partial_end,
+                PlaidTransaction.amount > 0,
+                not_(PlaidTransaction.is_deleted)
+            )
+            .group_by(PlaidTransaction.category)
+            .all()
+        )
+        count_rows(len(manual_results) + len(plaid_results))
+        for category, total in list(manual_results) + list(plaid_results):
+            summary[category] = summary.get(category, 0) + float(total)
+        for _, category, amount in archive.spending(user_id, start, partial_end):
+            summary[category] = summary.get(category, 0) + amount
+
+    rollup_results = (
+        db.query(CategoryRollup.category, func.sum(CategoryRollup.total))
+        .filter(
+            CategoryRollup.user_id == user_id,
+            CategoryRollup.month >= rollup_from
+        )
+        .group_by(CategoryRollup.category)
+        .all()
+    )
+    count_rows(len(rollup_results))
+    for category, total in rollup_results:
+        summary[category] = summary.get(category, 0) + float(total)
+
+    # deltas can leave tiny float residue on emptied categories
+    return {category: total for category, total in summary.items() if abs(total) > 1e-9}
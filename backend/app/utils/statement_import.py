@@ -0,0 +1,355 @@
+import codecs
+import csv
+import hashlib
+import html
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Transaction, TransactionImport
+from app.utils import archive, rollups
+from app.utils.categorize import engine_for
+from app.utils.versioning import touch
+
+# Bank statement uploads (CSV or OFX) into manual transactions. The upload is
+# spooled to disk and parsed here in the background, one record at a time,
+# so memory only grows by a counter per distinct row. Records are
+# categorized with the user's rules, deduplicated against earlier imports by
+# import_hash and inserted in chunks; each chunk commits together with the
+# job's progress counters. Archived years are read-only: records dated before
+# the user's archive cutoff count as duplicates if a segment has their hash
+# and are skipped otherwise.
+#
+# Amounts follow the bank's sign (negative = money out) and are flipped to
+# ours, where spending is positive. CSVs with separate debit/credit columns
+# need no flipping.
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_ROWS = 1000
+READ_CHUNK_BYTES = 64 * 1024
+
+CSV_COLUMNS = {
+    "date": ("date", "transaction date", "posted date", "posting date", "trans. date", "booking date"),
+    "amount": ("amount", "transaction amount"),
+    "debit": ("debit", "debit amount", "withdrawal", "withdrawals"),
+    "credit": ("credit", "credit amount", "deposit", "deposits"),
+    "description": ("description", "name", "payee", "merchant", "details", "memo"),
+    "category": ("category",),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%d.%m.%Y")
+
+
+class StatementError(ValueError):
+    pass
+
+
+class _Progress:
+    def __init__(self):
+        self.bytes_read = 0
+        self.rows_read = 0
+        self.skipped = 0
+
+
+def _lines(f, progress):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    for raw in f:
+        progress.bytes_read += len(raw)
+        yield decoder.decode(raw)
+
+
+def parse_date(value, formats=DATE_FORMATS):
+    value = value.strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return datetime.fromisoformat(value)
+
+
+def parse_amount(value):
+    value = value.strip().replace("$", "").replace(",", "").replace(" ", "")
+    if not value:
+        return None
+    if value.startswith("(") and value.endswith(")"):
+        return -float(value[1:-1])
+    return float(value)
+
+
+def _csv_columns(header):
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    if "date" not in columns or not ({"amount", "debit"} & columns.keys()):
+        raise StatementError("CSV needs a date column and an amount or debit column")
+    return columns
+
+
+def parse_csv(f, progress, spending_positive=False):
+    reader = csv.reader(_lines(f, progress))
+    try:
+        header = next(reader, None)
+    except csv.Error as e:
+        raise StatementError(f"CSV header on line {reader.line_num}: {e}")
+    if header is None:
+        return
+    columns = _csv_columns(header)
+
+    def field(row, name):
+        index = columns.get(name)
+        return row[index] if index is not None and index < len(row) else ""
+
+    while True:
+        # a malformed line (NUL bytes, an oversized field, an unterminated
+        # quote) is skipped like any other unreadable row
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error:
+            progress.rows_read += 1
+            progress.skipped += 1
+            continue
+        if not any(cell.strip() for cell in row):
+            continue
+        progress.rows_read += 1
+        try:
+            if "amount" in columns:
+                amount = parse_amount(field(row, "amount"))
+                if not spending_positive:
+                    amount = -amount
+            else:
+                amount = (parse_amount(field(row, "debit")) or 0) - (parse_amount(field(row, "credit")) or 0)
+            yield {
+                "timestamp": parse_date(field(row, "date")),
+                "amount": amount,
+                "description": field(row, "description").strip() or None,
+                "category": field(row, "category").strip() or None,
+                "key": None,
+            }
+        except (TypeError, ValueError):
+            progress.skipped += 1
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _ofx_tags(f, progress):
+    # OFX 1.x is SGML (leaf elements are never closed) and 2.x is XML, so
+    # read (closing, tag, text) tokens rather than parsing a tree.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    while True:
+        raw = f.read(READ_CHUNK_BYTES)
+        progress.bytes_read += len(raw)
+        buffer += decoder.decode(raw, final=not raw)
+        # keep a tag that may continue in the next chunk
+        cut = buffer.rfind("<") if raw else len(buffer)
+        for match in _OFX_TAG.finditer(buffer, 0, max(cut, 0)):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[max(cut, 0):]
+        if not raw:
+            return
+
+
+def _ofx_record(fields, account):
+    posted = fields["DTPOSTED"][:8]
+    name = html.unescape(fields.get("NAME") or fields.get("PAYEE") or fields.get("MEMO") or "")
+    return {
+        "timestamp": datetime.strptime(posted, "%Y%m%d"),
+        "amount": -parse_amount(fields["TRNAMT"]),
+        "description": name or None,
+        "category": None,
+        "key": f"ofx|{account}|{fields['FITID']}" if fields.get("FITID") else None,
+    }
+
+
+def parse_ofx(f, progress):
+    account = ""
+    fields = None
+    for closing, tag, text in _ofx_tags(f, progress):
+        if tag == "STMTTRN":
+            if fields is not None:
+                progress.rows_read += 1
+                try:
+                    yield _ofx_record(fields, account)
+                except (KeyError, TypeError, ValueError):
+                    progress.skipped += 1
+            fields = None if closing else {}
+        elif tag == "ACCTID" and text:
+            account = text
+        elif fields is not None and not closing:
+            fields[tag] = text
+
+
+def _hashed(records):
+    # Statements have no stable IDs (OFX's FITID aside), so a row is
+    # identified by date, amount and description plus how many identical
+    # rows came before it in the file. The count covers the whole file, as
+    # statements sorted by posted date or with pending rows mixed in don't
+    # keep a day's rows together.
+    seen = defaultdict(int)
+    for record in records:
+        basis = record.pop("key")
+        if basis is None:
+            basis = f"{record['timestamp'].date()}|{record['amount']:.2f}|{(record['description'] or '').lower()}"
+            seen[basis] += 1
+            basis = f"{basis}|{seen[basis]}"
+        record["import_hash"] = hashlib.sha1(basis.encode()).hexdigest()
+        yield record
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_chunk(db: Session, user_id, chunk, engine, cutoff=None):
+    # Returns (inserted, duplicates, skipped); cutoff is the user's archive
+    # cutoff as a datetime. Does not commit.
+    hashes = {row["import_hash"] for row in chunk}
+    existing = {
+        value for (value,) in db.query(Transaction.import_hash).filter(
+            Transaction.user_id == user_id, Transaction.import_hash.in_(hashes)
+        )
+    }
+    archived = set()
+    if cutoff is not None:
+        archived = {row["import_hash"] for row in chunk if row["timestamp"] < cutoff}
+        existing |= archive.archived_hashes(user_id, archived, cutoff)
+    rows, deltas = [], defaultdict(float)
+    skipped = 0
+    for record in chunk:
+        if record["import_hash"] in existing:
+            continue
+        if record["import_hash"] in archived:
+            skipped += 1
+            continue
+        existing.add(record["import_hash"])
+        category = engine.categorize(record["description"], default=record["category"])
+        rows.append({
+            "user_id": user_id,
+            "amount": record["amount"],
+            "category": category,
+            "description": record["description"],
+            "timestamp": record["timestamp"],
+            "import_hash": record["import_hash"],
+        })
+    inserted = _insert_new(db, rows)
+    for row in rows:
+        if row["import_hash"] in inserted:
+            deltas[(rollups.month_start(row["timestamp"]), row["category"])] += rollups.contribution(row["amount"])
+    if inserted:
+        rollups.apply_deltas(db, user_id, deltas)
+        touch(db, user_id)
+    return len(inserted), len(chunk) - len(inserted) - skipped, skipped
+
+
+def _insert_new(db: Session, rows):
+    # Inserts rows and returns the import_hashes that went in. The SELECT in
+    # insert_chunk doesn't see an import of the same file running alongside,
+    # so rows it commits first are skipped here rather than failing the job.
+    if not rows:
+        return set()
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(Transaction)
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=[Transaction.user_id, Transaction.import_hash]
+        ).returning(Transaction.import_hash)
+        return set(db.execute(stmt, rows).scalars())
+    db.execute(insert(Transaction), rows)
+    return {row["import_hash"] for row in rows}
+
+
+def create_job(user_id, format, bytes_total):
+    db = SessionLocal()
+    try:
+        job = TransactionImport(user_id=user_id, format=format, bytes_total=bytes_total)
+        db.add(job)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+
+def run_import(job_id, path, spending_positive=False, chunk_rows=IMPORT_CHUNK_ROWS):
+    db = SessionLocal()
+    try:
+        job = db.get(TransactionImport, job_id)
+        job.status = "running"
+        db.commit()
+        progress = _Progress()
+        engine = engine_for(db, job.user_id)
+        cutoff = archive.archived_before(job.user_id)
+        if cutoff is not None:
+            cutoff = datetime.combine(cutoff, datetime.min.time())
+        too_old = 0
+        with open(path, "rb") as f:
+            if job.format == "ofx":
+                records = parse_ofx(f, progress)
+            else:
+                records = parse_csv(f, progress, spending_positive)
+            for chunk in _chunks(_hashed(records), chunk_rows):
+                inserted, duplicates, skipped = insert_chunk(db, job.user_id, chunk, engine, cutoff)
+                too_old += skipped
+                job.inserted += inserted
+                job.duplicates += duplicates
+                job.bytes_read = progress.bytes_read
+                job.rows_read = progress.rows_read
+                job.skipped = progress.skipped + too_old
+                db.commit()
+        job.bytes_read = progress.bytes_read
+        job.rows_read = progress.rows_read
+        job.skipped = progress.skipped + too_old
+        job.status = "completed"
+        job.finished_at = datetime.now()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        if not isinstance(e, StatementError):
+            logger.exception("Statement import %s failed", job_id)
+        job = db.get(TransactionImport, job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = str(e) if isinstance(e, StatementError) else "Import failed"
+            job.finished_at = datetime.now()
+            db.commit()
+    finally:
+        db.close()
+        os.remove(path)
+
+
+def job_status(job):
+    return {
+        "id": job.id,
+        "format": job.format,
+        "status": job.status,
+        "bytes_total": job.bytes_total,
+        "bytes_read": job.bytes_read,
+        "progress": round(job.bytes_read / job.bytes_total, 4) if job.bytes_total else None,
+        "rows_read": job.rows_read,
+        "inserted": job.inserted,
+        "duplicates": job.duplicates,
+        "skipped": job.skipped,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
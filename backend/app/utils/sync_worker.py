@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
+from sqlalchemy import text
+from app.database import SessionLocal, engine
+from app.models import User
+from app.utils.plaid_sync import sync_transactions
+
+logger = logging.getLogger(__name__)
+
+SYNC_ENABLED = os.getenv("PLAID_SYNC_ENABLED", "true").lower() == "true"
+SYNC_INTERVAL_SECONDS = float(os.getenv("PLAID_SYNC_INTERVAL_SECONDS", "900"))
+SYNC_CONCURRENCY = int(os.getenv("PLAID_SYNC_CONCURRENCY", "4"))
+SYNC_JITTER_SECONDS = float(os.getenv("PLAID_SYNC_JITTER_SECONDS", "30"))
+SYNC_LOCK_FILE = os.getenv("PLAID_SYNC_LOCK_FILE", os.path.join(tempfile.gettempdir(), "vint-plaid-sync.lock"))
+SYNC_ADVISORY_LOCK_KEY = 0x76696E74  # "vint"
+
+try:
+    import fcntl
+except ImportError:  # Windows; one worker is all a dev box runs
+    fcntl = None
+
+
+def linked_user_ids():
+    db = SessionLocal()
+    try:
+        return [
+            row.id
+            for row in db.query(User.id).filter(User.plaid_access_token.isnot(None)).all()
+        ]
+    finally:
+        db.close()
+
+
+# user_id -> [lock, holders and waiters]; entries go once nobody needs them
+_user_locks = {}
+_user_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _user_lock(user_id):
+    with _user_locks_guard:
+        entry = _user_locks.setdefault(user_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _user_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _user_locks[user_id]
+
+
+def sync_user(user_id, plaid=None):
+    # Scheduled rounds and on-demand syncs can overlap for the same user.
+    # The in-process lock saves one worker from fetching twice;
+    # sync_transactions claims the cursor atomically to cover other workers.
+    with _user_lock(user_id):
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user or not user.plaid_access_token:
+                return None
+            return sync_transactions(db, user, plaid)
+        finally:
+            db.close()
+
+
+class SchedulerLock:
+    # Every uvicorn worker and replica starts run_forever, but only the one
+    # holding this lock runs rounds; the others retry each interval and take
+    # over if the leader goes away. On PostgreSQL it is a session advisory
+    # lock on a connection kept out of the pool while we lead, so it spans
+    # replicas. Otherwise it is a flock on PLAID_SYNC_LOCK_FILE, which spans
+    # the workers of one host (SQLite deployments are single-host anyway).
+
+    def __init__(self):
+        self._connection = None
+        self._file = None
+
+    def acquire(self):
+        if engine.dialect.name == "postgresql":
+            return self._acquire_advisory()
+        return self._acquire_file()
+
+    def _acquire_advisory(self):
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                self._connection.rollback()
+                return True
+            except Exception:
+                # the connection went away and took the lock with it
+                logger.warning("Lost the Plaid sync scheduler lock")
+                self._connection.invalidate()
+                self._connection = None
+        connection = engine.connect()
+        try:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": SYNC_ADVISORY_LOCK_KEY}
+            ).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _acquire_file(self):
+        if self._file is not None or fcntl is None:
+            return True
+        f = open(SYNC_LOCK_FILE, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._connection is not None:
+            # a pooled connection keeps session locks when it is returned,
+            # so unlock first, and never reuse it if that fails
+            try:
+                self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SYNC_ADVISORY_LOCK_KEY})
+                self._connection.commit()
+                self._connection.close()
+            except Exception:
+                self._connection.invalidate()
+            self._connection = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def _sync_one(user_id, semaphore, plaid=None):
+    # Jitter spreads each round out so linked users don't all hit Plaid at once.
+    await asyncio.sleep(random.uniform(0, SYNC_JITTER_SECONDS))
+    async with semaphore:
+        try:
+            await asyncio.to_thread(sync_user, user_id, plaid)
+        except Exception:
+            logger.exception("Plaid sync failed for user %s", user_id)
+
+
+async def run_sync_round(plaid=None):
+    user_ids = await asyncio.to_thread(linked_user_ids)
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+    await asyncio.gather(*(_sync_one(user_id, semaphore, plaid) for user_id in user_ids))
+    return len(user_ids)
+
+
+async def run_forever(plaid=None, lock=None):
+    loop = asyncio.get_running_loop()
+    lock = lock or SchedulerLock()
+    try:
+        while True:
+            started = loop.time()
+            try:
+                if await asyncio.to_thread(lock.acquire):
+                    count = await run_sync_round(plaid)
+                    logger.info("Plaid sync round finished for %d users", count)
+            except Exception:
+                logger.exception("Plaid sync round failed")
+            await asyncio.sleep(max(0, SYNC_INTERVAL_SECONDS - (loop.time() - started)))
+    finally:
+        lock.release()
+
+
+def start():
+    if not SYNC_ENABLED:
+        return None
+    return asyncio.create_task(run_forever())
+
+
+async def stop(task):
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
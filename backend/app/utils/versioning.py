@@ -0,0 +1,76 @@
+from itertools import chain
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from app.models import PlaidTransaction, Transaction, User
+
+# Every user carries a data_version that goes up once per commit that changes
+# their transactions. It backs the ETags on the read endpoints and the version
+# returned by mutations, so clients can tell whether their copy is current.
+#
+# ORM changes to Transaction/PlaidTransaction are picked up at flush time.
+# Bulk statements (query.update/delete, the sync upsert) bypass the unit of
+# work, so code issuing them calls touch() itself.
+
+TOUCHED = "touched_user_ids"
+BUMPED = "bumped_user_ids"
+VERSIONED = (Transaction, PlaidTransaction)
+
+
+def touch(db: Session, user_id):
+    db.info.setdefault(TOUCHED, set()).add(user_id)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_touched_users(session, flush_context, instances):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, VERSIONED):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        user_id = obj.user_id if obj.user_id is not None else obj.user.id
+        touch(session, user_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    session.flush()
+    user_ids = session.info.pop(TOUCHED, None)
+    if not user_ids:
+        return
+    # incremented in SQL so concurrent writers can't lose a bump
+    session.execute(
+        update(User).where(User.id.in_(user_ids)).values(data_version=User.data_version + 1),
+        execution_options={"synchronize_session": False},
+    )
+    session.info.setdefault(BUMPED, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched_users(session):
+    session.info.pop(TOUCHED, None)
+    session.info.pop(BUMPED, None)
+
+
+def current_version(db: Session, user_id):
+    # The user from get_current_user is a per-worker snapshot, so anything
+    # that must see other workers' commits reads the version itself.
+    return db.query(User.data_version).filter(User.id == user_id).scalar()
+
+
+def etag(user_id, version, *variant):
+    return '"' + "-".join(str(part) for part in (user_id, version, *variant)) + '"'
+
+
+def cache_headers(tag):
+    # let browsers keep the body but revalidate it on every use
+    return {"ETag": tag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(request, tag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as RFC 9110 asks for If-None-Match
+    return tag in (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
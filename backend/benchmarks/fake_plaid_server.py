@@ -0,0 +1,199 @@
+"""Local HTTP stand-in for the Plaid API, backed by FakePlaidClient.
+
+Serves /transactions/sync and /transactions/get with the same JSON shapes as
+Plaid, so plaid-python clients (and the refresh job) can run against it by
+pointing PLAID_HOST at it. Every new access token gets a synthetic history.
+--rate-limit answers 429 RATE_LIMIT_EXCEEDED above that many requests per
+second, to exercise client-side backoff.
+
+    cd backend
+    python -m benchmarks.fake_plaid_server --port 8765 --transactions 300 --rate-limit 50
+    PLAID_HOST=http://127.0.0.1:8765 python -m app.jobs.refresh_all
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.fake_plaid import FakePlaidClient  # noqa: E402
+
+
+def transaction_json(t):
+    # every field plaid-python's Transaction model requires, nulls where we
+    # have nothing better
+    pfc = t["personal_finance_category"]
+    return {
+        "account_id": t["account_id"],
+        "account_owner": None,
+        "amount": t["amount"],
+        "iso_currency_code": t["iso_currency_code"],
+        "unofficial_currency_code": None,
+        "category": None,
+        "category_id": None,
+        "check_number": None,
+        "date": t["date"].isoformat(),
+        "datetime": None,
+        "authorized_date": None,
+        "authorized_datetime": None,
+        "location": {
+            "address": None, "city": None, "region": None, "postal_code": None,
+            "country": None, "lat": None, "lon": None, "store_number": None,
+        },
+        "name": t["name"],
+        "merchant_name": t["merchant_name"],
+        "payment_meta": {
+            "by_order_of": None, "payee": None, "payer": None, "payment_method": None,
+            "payment_processor": None, "ppd_id": None, "reason": None, "reference_number": None,
+        },
+        "payment_channel": t["payment_channel"],
+        "pending": t["pending"],
+        "pending_transaction_id": None,
+        "personal_finance_category": {
+            "primary": pfc["primary"], "detailed": pfc["detailed"], "confidence_level": "HIGH",
+        },
+        "transaction_id": t["transaction_id"],
+        "transaction_code": None,
+        "transaction_type": "place",
+    }
+
+
+def plaid_error(error_type, error_code, message):
+    return {
+        "error_type": error_type,
+        "error_code": error_code,
+        "error_message": message,
+        "display_message": None,
+        "request_id": uuid.uuid4().hex[:15],
+    }
+
+
+class RequestWindow:
+    # requests seen in the current one-second window
+    def __init__(self, limit):
+        self.limit = limit
+        self.second = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not self.limit:
+            return True
+        with self._lock:
+            now = int(time.monotonic())
+            if now != self.second:
+                self.second, self.count = now, 0
+            self.count += 1
+            return self.count <= self.limit
+
+
+def make_handler(fake, window, history, days, seed):
+    seeded = set()
+    seed_lock = threading.Lock()
+    stats = {"requests": 0, "rate_limited": 0}
+
+    def ensure_history(access_token):
+        with seed_lock:
+            if access_token not in seeded:
+                seeded.add(access_token)
+                rng = random.Random(f"{seed}:{access_token}")
+                fake.seed_history(access_token, history, days=days, rng=rng)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            stats["requests"] += 1
+            if not window.allow():
+                stats["rate_limited"] += 1
+                self._send(429, plaid_error("RATE_LIMIT_EXCEEDED", "TRANSACTIONS_SYNC_LIMIT", "rate limit exceeded"))
+                return
+            access_token = body.get("access_token")
+            if not access_token:
+                self._send(400, plaid_error("INVALID_REQUEST", "MISSING_FIELDS", "access_token is required"))
+                return
+            ensure_history(access_token)
+
+            if self.path == "/transactions/sync":
+                response = fake.transactions_sync(body)
+                response = {
+                    "accounts": [],
+                    "added": [transaction_json(t) for t in response["added"]],
+                    "modified": [transaction_json(t) for t in response["modified"]],
+                    "removed": response["removed"],
+                    "next_cursor": response["next_cursor"],
+                    "has_more": response["has_more"],
+                    "request_id": uuid.uuid4().hex[:15],
+                }
+            elif self.path == "/transactions/get":
+                body["start_date"] = date.fromisoformat(body["start_date"])
+                body["end_date"] = date.fromisoformat(body["end_date"])
+                response = fake.transactions_get(body)
+                response = {
+                    "accounts": [],
+                    "transactions": [transaction_json(t) for t in response["transactions"]],
+                    "total_transactions": response["total_transactions"],
+                    "item": {"item_id": "item-" + access_token[-8:], "webhook": None, "error": None,
+                             "available_products": [], "billed_products": ["transactions"],
+                             "consent_expiration_time": None, "update_type": "background"},
+                    "request_id": uuid.uuid4().hex[:15],
+                }
+            else:
+                self._send(404, plaid_error("INVALID_REQUEST", "NOT_FOUND", f"unknown endpoint {self.path}"))
+                return
+            self._send(200, response)
+
+    Handler.stats = stats
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8765, history=300, days=90, latency=0.0, rate_limit=0, seed=7):
+    fake = FakePlaidClient(latency=latency)
+    handler = make_handler(fake, RequestWindow(rate_limit), history, days, seed)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.fake = fake
+    server.stats = handler.stats
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--transactions", type=int, default=300, help="history per access token")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per second, 0 for none")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.transactions, args.days, args.latency, args.rate_limit, args.seed)
+    print(f"Fake Plaid listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Concurrent load test for the summary, Plaid listing, sync and hide/restore routes.
+
+Seeds a scratch database with synthetic users, replaces the Plaid client
+with an in-memory fake (with configurable latency), then drives the app
+in-process from many concurrent virtual users. Prints throughput and
+latency percentiles per scenario as JSON so runs can be diffed.
+
+    cd backend
+    python -m benchmarks.load --users 50 --plaid 2000 --concurrency 32 --duration 30
+    python -m benchmarks.load --plaid-latency 0.25 --output bench_output.json
+
+Needs httpx. The target database is dropped and recreated, so never point
+--database-url at real data.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+SCENARIO_WEIGHTS = {
+    "summary": 5,
+    "summary_30_days": 2,
+    "plaid_transactions": 3,
+    "plaid_all_transactions": 2,
+    "hide_restore": 1,
+    "plaid_sync": 1,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--manual", type=int, default=500, help="manual transactions per user")
+    parser.add_argument("--plaid", type=int, default=1000, help="Plaid transactions per user")
+    parser.add_argument("--days", type=int, default=365, help="history length per user")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds")
+    parser.add_argument("--plaid-latency", type=float, default=0.05, help="seconds per fake Plaid call")
+    parser.add_argument("--plaid-jitter", type=float, default=0.02)
+    parser.add_argument("--new-per-sync", type=int, default=5, help="new Plaid transactions before each sync")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url is None:
+    args.database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+os.environ["DATABASE_URL"] = args.database_url
+os.environ["PLAID_SYNC_ENABLED"] = "false"
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils import plaid_client  # noqa: E402
+from app.utils.fake_plaid import FakePlaidClient, make_transaction  # noqa: E402
+from benchmarks.seed import seed_users  # noqa: E402
+
+
+def install_fake_plaid():
+    fake = FakePlaidClient(latency=args.plaid_latency, jitter=args.plaid_jitter)
+    plaid_client.set_client(fake)
+    return fake
+
+
+async def summary(client, account, rng, fake):
+    return [await client.get("/transactions/summary", headers=account["headers"])]
+
+
+async def summary_30_days(client, account, rng, fake):
+    return [await client.get("/transactions/summary", params={"days": 30}, headers=account["headers"])]
+
+
+async def plaid_transactions(client, account, rng, fake):
+    return [await client.get("/plaid/transactions", headers=account["headers"])]
+
+
+async def plaid_all_transactions(client, account, rng, fake):
+    return [await client.get("/plaid/all_transactions", headers=account["headers"])]
+
+
+async def hide_restore(client, account, rng, fake):
+    transaction_id = rng.choice(account["plaid_ids"])
+    hidden = await client.delete(f"/plaid/delete_transaction/{transaction_id}", headers=account["headers"])
+    restored = await client.post(f"/plaid/restore_transaction/{transaction_id}", headers=account["headers"])
+    return [hidden, restored]
+
+
+async def plaid_sync_scenario(client, account, rng, fake):
+    fake.add_transactions(account["access_token"], [make_transaction(rng=rng) for _ in range(args.new_per_sync)])
+    return [await client.post("/plaid/sync", headers=account["headers"])]
+
+
+SCENARIOS = {
+    "summary": summary,
+    "summary_30_days": summary_30_days,
+    "plaid_transactions": plaid_transactions,
+    "plaid_all_transactions": plaid_all_transactions,
+    "hide_restore": hide_restore,
+    "plaid_sync": plaid_sync_scenario,
+}
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+def summarize(latencies, statuses, elapsed):
+    report = {}
+    for name in SCENARIOS:
+        ordered = sorted(latencies[name])
+        codes = statuses[name]
+        report[name] = {
+            "requests": len(ordered),
+            "throughput_rps": round(len(ordered) / elapsed, 2),
+            "p50_ms": percentile(ordered, 50),
+            "p90_ms": percentile(ordered, 90),
+            "p99_ms": percentile(ordered, 99),
+            "max_ms": round(ordered[-1], 3) if ordered else None,
+            "client_errors": sum(n for code, n in codes.items() if isinstance(code, int) and 400 <= code < 500),
+            "server_errors": sum(n for code, n in codes.items() if not isinstance(code, int) or code >= 500),
+        }
+    return report
+
+
+async def drive(accounts, fake):
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    names = list(SCENARIO_WEIGHTS)
+    weights = [SCENARIO_WEIGHTS[name] for name in names]
+
+    async def virtual_user(n, client, deadline):
+        rng = random.Random(args.seed * 1000 + n)
+        account = accounts[n % len(accounts)]
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                responses = await SCENARIOS[name](client, account, rng, fake)
+                for response in responses:
+                    statuses[name][response.status_code] += 1
+            except Exception as e:
+                statuses[name][type(e).__name__] += 1
+            latencies[name].append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=None) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(virtual_user(n, client, deadline) for n in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, statuses, elapsed), elapsed
+
+
+def main():
+    engine.echo = False
+    fake = install_fake_plaid()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    seed_started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        accounts = seed_users(db, fake, args.users, args.manual, args.plaid, days=args.days, seed=args.seed)
+    finally:
+        db.close()
+    seed_seconds = time.perf_counter() - seed_started
+    for account in accounts:
+        account["headers"] = {"Authorization": f"Bearer {account['jwt']}"}
+
+    scenarios, elapsed = asyncio.run(drive(accounts, fake))
+    total = sum(s["requests"] for s in scenarios.values())
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "database_url")},
+        "database": engine.dialect.name,
+        "seed_seconds": round(seed_seconds, 2),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2),
+        "plaid_calls": fake.calls,
+        "scenarios": scenarios,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Query plans and timings for the per-user hot queries, before and after
+the composite indexes.
+
+Seeds a scratch database, runs each query with only the primary key and
+unique indexes, then adds the composite indexes from app.models and runs
+them again. Prints a JSON report.
+
+    cd backend
+    python -m benchmarks.query_plans --rows 2000000 --users 2000
+    python -m benchmarks.query_plans --database-url postgresql://localhost/vint_bench
+
+The target database is dropped and recreated, so never point it at real data.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+HOT_INDEXES = {
+    "ix_transactions_user_id_timestamp",
+    "ix_transactions_user_id_category",
+    "ix_plaid_transactions_user_id_date",
+    "ix_plaid_transactions_user_id_category",
+    "ix_plaid_transactions_user_id_is_deleted",
+}
+CATEGORIES = ["Food", "Bills", "Shopping", "Transportation", "Entertainment", "Health", "Income", "Other"]
+SEED_CHUNK = 50_000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per transaction table")
+    parser.add_argument("--days", type=int, default=730, help="history length to spread rows over")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url is None:
+    args.database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_plans.db")
+os.environ["DATABASE_URL"] = args.database_url
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import func, not_, select, text  # noqa: E402
+from app.database import Base, engine  # noqa: E402
+from app import models  # noqa: E402
+
+engine.echo = False
+
+
+def seed(conn, rng):
+    now = datetime.now()
+    conn.execute(models.User.__table__.insert(), [
+        {"id": i, "email": f"user{i}@bench.local", "monthly_budget": 2000} for i in range(1, args.users + 1)
+    ])
+    for start in range(0, args.rows, SEED_CHUNK):
+        size = min(SEED_CHUNK, args.rows - start)
+        manual, plaid = [], []
+        for n in range(start, start + size):
+            user_id = rng.randint(1, args.users)
+            when = now - timedelta(seconds=rng.randint(0, args.days * 86400))
+            category = rng.choice(CATEGORIES)
+            amount = round(rng.uniform(-50, 300), 2)
+            manual.append({"user_id": user_id, "amount": amount, "category": category, "timestamp": when})
+            is_deleted = rng.random() < 0.02
+            plaid.append({
+                "user_id": user_id, "transaction_id": f"bench-{n}", "amount": amount,
+                "category": category, "date": when.replace(hour=0, minute=0, second=0, microsecond=0),
+                "is_deleted": is_deleted, "deleted_at": now if is_deleted else None,
+            })
+        conn.execute(models.Transaction.__table__.insert(), manual)
+        conn.execute(models.PlaidTransaction.__table__.insert(), plaid)
+
+
+def hot_queries(user_id):
+    month_start = datetime.today().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    Transaction, PlaidTransaction = models.Transaction, models.PlaidTransaction
+    return {
+        "summary_manual": select(Transaction.category, func.sum(Transaction.amount))
+            .where(Transaction.user_id == user_id, Transaction.timestamp >= month_start, Transaction.amount > 0)
+            .group_by(Transaction.category),
+        "summary_plaid": select(PlaidTransaction.category, func.sum(PlaidTransaction.amount))
+            .where(PlaidTransaction.user_id == user_id, PlaidTransaction.date >= month_start,
+                   PlaidTransaction.amount > 0, not_(PlaidTransaction.is_deleted))
+            .group_by(PlaidTransaction.category),
+        "hidden_ids": select(PlaidTransaction.transaction_id)
+            .where(PlaidTransaction.user_id == user_id, PlaidTransaction.is_deleted),
+        "feed_page": select(PlaidTransaction.id, PlaidTransaction.amount, PlaidTransaction.date)
+            .where(PlaidTransaction.user_id == user_id, not_(PlaidTransaction.is_deleted))
+            .order_by(PlaidTransaction.date.desc(), PlaidTransaction.id.desc())
+            .limit(51),
+        "category_filter": select(Transaction.id, Transaction.amount)
+            .where(Transaction.user_id == user_id, Transaction.category == "Food"),
+    }
+
+
+def explain(conn, stmt):
+    compiled = stmt.compile(conn, compile_kwargs={"literal_binds": True})
+    if conn.dialect.name == "sqlite":
+        return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+    if conn.dialect.name == "postgresql":
+        return [row[0] for row in conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}"))]
+    return [str(row) for row in conn.execute(text(f"EXPLAIN {compiled}"))]
+
+
+def measure(conn, rng):
+    report = {}
+    for name in hot_queries(1):
+        timings = []
+        for _ in range(args.repeat):
+            stmt = hot_queries(rng.randint(1, args.users))[name]
+            started = time.perf_counter()
+            conn.execute(stmt).all()
+            timings.append((time.perf_counter() - started) * 1000)
+        report[name] = {
+            "plan": explain(conn, hot_queries(1)[name]),
+            "median_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+        }
+    return report
+
+
+def main():
+    rng = random.Random(args.seed)
+    Base.metadata.drop_all(bind=engine)
+    hot_index_objects = [
+        index for table in Base.metadata.sorted_tables for index in table.indexes if index.name in HOT_INDEXES
+    ]
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for index in hot_index_objects:
+            index.drop(conn)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        seed(conn, rng)
+    seed_seconds = time.perf_counter() - started
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+        before = measure(conn, random.Random(args.seed))
+        for index in hot_index_objects:
+            index.create(conn)
+        conn.execute(text("ANALYZE"))
+        after = measure(conn, random.Random(args.seed))
+
+    print(json.dumps({
+        "database": engine.dialect.name,
+        "users": args.users,
+        "rows_per_table": args.rows,
+        "seed_seconds": round(seed_seconds, 1),
+        "queries": {name: {"before": before[name], "after": after[name]} for name in before},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Synthetic data generator for the benchmarks.
+
+Seeds N users, each with M manual transactions and P Plaid transactions,
+plus matching Plaid history in a FakePlaidClient so later syncs have
+deltas to pull. Rollups are built so summaries behave like production.
+"""
+import random
+from datetime import datetime, timedelta
+from jose import jwt  # type: ignore
+from app import models
+from app.routes.deps import JWT_SECRET, JWT_ALGORITHM
+from app.utils import rollups
+from app.utils.fake_plaid import make_transaction
+from app.utils.categorize import category_map
+from app.utils.plaid_sync import transaction_row
+
+CATEGORIES = sorted(set(category_map.values()))
+
+
+def seed_users(db, plaid, users, manual, plaid_rows, days=365, hidden_ratio=0.02, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now()
+    accounts = []
+    for n in range(users):
+        user = models.User(email=f"bench{n}-{seed}@bench.local", monthly_budget=2000,
+                           plaid_access_token=f"access-bench-{seed}-{n}")
+        db.add(user)
+        db.flush()
+
+        db.bulk_insert_mappings(models.Transaction, [
+            {
+                "user_id": user.id,
+                "amount": round(rng.uniform(-40, 300), 2),
+                "category": rng.choice(CATEGORIES),
+                "description": "bench",
+                "timestamp": now - timedelta(seconds=rng.randint(0, days * 86400)),
+            } for _ in range(manual)
+        ])
+
+        history = [
+            make_transaction(on=(now - timedelta(days=rng.randint(0, days - 1))).date(), rng=rng)
+            for _ in range(plaid_rows)
+        ]
+        plaid.add_transactions(user.plaid_access_token, history)
+        rows = [transaction_row(user.id, t) for t in history]
+        for row in rows:
+            row["is_deleted"] = rng.random() < hidden_ratio
+        db.bulk_insert_mappings(models.PlaidTransaction, rows)
+        # the DB already has this history, so start syncing after it
+        user.plaid_sync_cursor = str(len(plaid.changes[user.plaid_access_token]))
+
+        rollups.rebuild_months(db, user.id)
+        db.commit()
+        accounts.append({
+            "user_id": user.id,
+            "access_token": user.plaid_access_token,
+            "jwt": jwt.encode({"user_id": user.id}, JWT_SECRET, algorithm=JWT_ALGORITHM),
+            "plaid_ids": [t["transaction_id"] for t in history],
+        })
+    return accounts
@@ -0,0 +1,129 @@
+"""Cold start benchmark: import cost per module and time to first response.
+
+Each run starts a fresh interpreter, so nothing is cached in sys.modules.
+It reports three things. Import time comes from `python -X importtime`,
+split into our own modules and the heaviest third-party packages. The
+other two are the time to import app.main and the wall time from process
+spawn to the first response from GET /.
+
+    cd backend
+    python -m benchmarks.startup --runs 5 --output startup.json
+
+Needs httpx.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHILD = """
+import time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+import asyncio, httpx
+
+async def first_response():
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        return (await client.get("/")).status_code
+
+status = asyncio.run(first_response())
+print(status, imported - started, time.perf_counter() - started, flush=True)
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="third-party packages to list")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--output", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+def child_env(database_url):
+    env = dict(os.environ)
+    env["DATABASE_URL"] = database_url
+    env["PLAID_SYNC_ENABLED"] = "false"
+    env.setdefault("JWT_SECRET", "startup-secret")
+    env["PYTHONPATH"] = BACKEND + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_times(env):
+    # -X importtime lines look like "import time: self [us] | cumulative | name".
+    # Our modules are reported by cumulative time, other packages by the
+    # summed self time of everything under them.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    app_modules, packages = {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name == "app" or name.startswith("app."):
+            app_modules[name] = int(cumulative_us) / 1000
+        else:
+            root = name.split(".")[0]
+            packages[root] = packages.get(root, 0) + int(self_us) / 1000
+    return app_modules, packages
+
+
+def first_response(env):
+    spawned = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - spawned
+    status, import_seconds, response_seconds = result.stdout.split()
+    return int(status), float(import_seconds), float(response_seconds), wall
+
+
+def median_times(runs):
+    names = set().union(*runs)
+    return {name: round(statistics.median(run.get(name, 0.0) for run in runs), 2) for name in names}
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")
+    env = child_env(database_url)
+
+    app_runs, package_runs, responses = [], [], []
+    for _ in range(args.runs):
+        app_modules, packages = import_times(env)
+        app_runs.append(app_modules)
+        package_runs.append(packages)
+        responses.append(first_response(env))
+
+    app_modules = median_times(app_runs)
+    packages = median_times(package_runs)
+    report = {
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "import_app_main_ms": round(statistics.median(r[1] for r in responses) * 1000, 1),
+        "first_response_ms": round(statistics.median(r[2] for r in responses) * 1000, 1),
+        "spawn_to_first_response_ms": round(statistics.median(r[3] for r in responses) * 1000, 1),
+        "first_response_status": responses[-1][0],
+        "app_modules_cumulative_ms": dict(sorted(app_modules.items(), key=lambda item: -item[1])),
+        "packages_self_ms": dict(sorted(packages.items(), key=lambda item: -item[1])[:args.top]),
+        "loaded": sorted(name for name in ("plaid", "google", "numpy", "requests") if name in packages),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()